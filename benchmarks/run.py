@@ -0,0 +1,193 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from benchmarks.synthetic import gbm_bars
+from common.indicator_cache import default_cache
+from common.range_index import DonchianIndex
+
+DEFAULT_SIZES = ['10k', '100k', '1M', '10M']
+
+
+_scripts = {}
+
+
+def load_script(name, path):
+    # Strategy scripts live in plain folders (and 3ema.py is not a valid module name)
+    if name not in _scripts:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _scripts[name] = module
+    return _scripts[name]
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {'k': 10 ** 3, 'm': 10 ** 6}.get(text[-1], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+# Each benchmark runs one strategy on `data` and times its stages through stage(name, func)
+
+def bench_high_low(data, stage):
+    high_low = load_script('high_low', 'high_low.py')
+    index = stage('indicators', lambda: DonchianIndex(data['High'], data['Low'], max_window=20))
+    stage('signals+backtest', lambda: high_low.backtest_strategy(data, 20, index, verbose=False))
+
+
+def bench_triple_ema(data, stage):
+    triple_ema = load_script('triple_ema', 'ema/3ema.py')
+    frame = data[['Open', 'High', 'Low', 'Close']].copy()
+    default_cache.clear()
+    stage('indicators', lambda: [triple_ema.ema(frame['Close'], period) for period in (10, 30, 100)])
+    # EMAs now come from the cache, so this is the signal and kernel cost
+    stage('signals+backtest', lambda: triple_ema.backtest(frame, 10, 30, 100, 0.05, 0.05))
+
+
+def bench_ichimoku_cloud(data, stage):
+    cloud = load_script('cloud_test', 'cloud/cloud_test.py')
+    strategy = cloud.IchimokuCloudStrategy()
+    strategy.data = data.reset_index()
+    stage('indicators', strategy.calculate_indicators)
+    stage('signals', strategy.calculate_signals)
+    stage('backtest', strategy.calculate_returns)
+
+
+def bench_fractal(data, stage):
+    fractal = load_script('fractal', 'william/fractal.py')
+    frame = data.reset_index()
+    params = {'window_size': 5, 'stop_loss_multiplier': 0.02, 'take_profit_multiplier': 0.03}
+    stage('indicators', lambda: fractal.calculate_fractals(frame, params['window_size']))
+    stage('signals+backtest', lambda: fractal.backtest_strategy(frame, params, initial_balance=10000))
+
+
+def bench_fisher(data, stage):
+    fisher_test = load_script('fisher_test', 'william/fisher_test.py')
+    frame = data[['Open', 'High', 'Low', 'Close']].copy()
+    default_cache.clear()
+    stage('indicators', lambda: fisher_test.calculate_fisher_transform(frame, 10))
+    stage('signals+backtest', lambda: fisher_test.strategy(frame, 10, 17, 1.1, 0.9))
+
+
+BENCHMARKS = {
+    'high_low': bench_high_low,
+    '3ema': bench_triple_ema,
+    'ichimoku_cloud': bench_ichimoku_cloud,
+    'fractal': bench_fractal,
+    'fisher': bench_fisher,
+}
+
+
+def run_benchmark(bench, data, repeat):
+    # Best of `repeat` runs per stage; the whole pipeline reruns so stages stay in order
+    best = {}
+    for _ in range(repeat):
+        def stage(name, func):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best[name] = min(best.get(name, elapsed), elapsed)
+            return result
+        bench(data, stage)
+    return best
+
+
+def run(sizes, strategies, repeat=3, seed=0):
+    # One small run first so numba compilation is not timed
+    warmup = gbm_bars(2000, seed=seed)
+    for name in strategies:
+        run_benchmark(BENCHMARKS[name], warmup, 1)
+
+    results = []
+    for n in sizes:
+        data = gbm_bars(n, seed=seed)
+        for name in strategies:
+            timings = run_benchmark(BENCHMARKS[name], data, repeat if n < 10 ** 7 else 1)
+            for stage, seconds in timings.items():
+                results.append({'strategy': name, 'stage': stage, 'bars': n, 'seconds': seconds,
+                                'bars_per_second': n / seconds if seconds > 0 else None})
+                print(f"{name:>15} {stage:>17} {n:>10,} bars {seconds:10.4f}s")
+        del data
+    return results
+
+
+def environment(seed, repeat):
+    versions = {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__}
+    try:
+        import numba
+        versions['numba'] = numba.__version__
+    except ImportError:
+        versions['numba'] = None
+    return {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'machine': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'repeat': repeat,
+        'versions': versions,
+    }
+
+
+def compare(baseline, current, threshold=0.2, min_seconds=0.005):
+    """Rows present in both result sets, flagging stages slower than baseline by more than `threshold`."""
+    base = {(r['strategy'], r['stage'], r['bars']): r['seconds'] for r in baseline['results']}
+    rows = []
+    for r in current['results']:
+        key = (r['strategy'], r['stage'], r['bars'])
+        if key not in base:
+            continue
+        ratio = r['seconds'] / base[key] if base[key] > 0 else float('inf')
+        # Sub-millisecond stages are mostly timer noise, so require an absolute slowdown too
+        regression = ratio > 1 + threshold and r['seconds'] - base[key] > min_seconds
+        rows.append({'strategy': key[0], 'stage': key[1], 'bars': key[2], 'baseline': base[key],
+                     'current': r['seconds'], 'ratio': ratio, 'regression': regression})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each strategy's stages on seeded synthetic bars.")
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES, help="bar counts, e.g. 10k 1M")
+    parser.add_argument('--strategies', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=3, help="runs per size, best time kept (10M runs once)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'latest.json'))
+    parser.add_argument('--compare', metavar='BASELINE', help="flag regressions against a stored result file")
+    parser.add_argument('--results', metavar='FILE', help="compare this result file instead of running")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed slowdown before flagging (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.results:
+        with open(args.results) as f:
+            current = json.load(f)
+    else:
+        results = run([parse_size(s) for s in args.sizes], args.strategies, args.repeat, args.seed)
+        current = {'environment': environment(args.seed, args.repeat), 'results': results}
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report = compare(baseline, current, args.threshold)
+        if report.empty:
+            print("No overlapping benchmarks with the baseline.")
+            sys.exit()
+        print(report.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+        regressions = report[report['regression']]
+        if len(regressions):
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+            sys.exit(1)
+        print("\nNo regressions.")
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+
+def gbm_bars(n, seed=0, start='2000-01-03', freq='min', price=100.0, drift=0.0, volatility=0.01):
+    """Seeded geometric Brownian motion OHLC bars with a UTC 'Datetime' index.
+
+    Closes follow GBM with per-bar `drift` and `volatility` (in log terms). Each
+    bar opens at the previous close. High and low are drawn from the exact
+    distribution of the maximum and minimum of a Brownian bridge between the
+    open and the close, so the wicks are consistent with the path in between.
+    Minute bars keep the index within pandas' Timestamp range (up to 2262) for
+    over 100M bars; hourly ones run out after about 2.3M.
+    """
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(drift - 0.5 * volatility ** 2, volatility, n)
+    log_close = np.log(price) + np.cumsum(steps)
+    log_open = np.empty(n)
+    log_open[0] = np.log(price)
+    log_open[1:] = log_close[:-1]
+
+    # Max/min of a bridge from a to b with variance s^2: (a + b +/- sqrt((b - a)^2 - 2 s^2 ln U)) / 2
+    spread = (log_close - log_open) ** 2
+    variance = 2 * volatility ** 2
+    log_high = 0.5 * (log_open + log_close + np.sqrt(spread - variance * np.log(rng.random(n))))
+    log_low = 0.5 * (log_open + log_close - np.sqrt(spread - variance * np.log(rng.random(n))))
+
+    index = pd.date_range(start, periods=n, freq=freq, tz='UTC', name='Datetime')
+    return pd.DataFrame({
+        'Open': np.exp(log_open),
+        'High': np.exp(log_high),
+        'Low': np.exp(log_low),
+        'Close': np.exp(log_close),
+        'Volume': rng.integers(100, 10000, n).astype(np.float64),
+    }, index=index)
@@ -2,7 +2,19 @@ import pandas as pd
 import numpy as np
 from scipy.optimize import minimize
 import matplotlib.pyplot as plt
-import pandas_montecarlo
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import indicators
+from common.bar_store import read_bars
+from common.intrabar import bar_times
+from common.kernel import run_backtest
+from common.metrics import trade_metrics
+from common.montecarlo import montecarlo
+from common.profiling import profiler
+from common.range_index import DonchianIndex
+from common.streaming import ATR, EMA, DonchianMidline
 
 class IchimokuCloudStrategy:
     def __init__(self, trading_volume=0.05, ema_period=50, conversion_period=9,
@@ -19,101 +31,113 @@ class IchimokuCloudStrategy:
         
         self.data = None
         self.signals = None
+        self.trades = None
+        self.range_index = None
+        self.midlines = {}
+        self.stream = None
 
+    @profiler.instrument('cloud.load_data', rows=lambda self, *args: len(self.data))
     def load_data(self, file_path):
-        self.data = pd.read_csv(file_path)
-        self.data.dropna(inplace=True)  # Drop any rows with NaN values
-
+        # Memory-mapped bars, already normalized to UTC with NaN rows dropped
+        self.data = read_bars(file_path).reset_index()
+        self.range_index = None
+        self.midlines = {}
+
+    def get_range_index(self):
+        # Built once per loaded series and shared by the conversion and base periods,
+        # keeping only the sparse-table levels those windows need
+        if self.range_index is None:
+            self.range_index = DonchianIndex(self.data['High'], self.data['Low'],
+                                             max_window=max(self.conversion_period, self.base_period))
+        return self.range_index
+
+    @profiler.instrument('cloud.calculate_indicators', rows=lambda self, *args: len(self.data))
     def calculate_indicators(self):
-        self.data['EMA'] = self.data['Close'].ewm(span=self.ema_period, adjust=False).mean()
-        self.data['ATR'] = self.calculate_atr(self.atr_period)
+        # EMA, ATR and both Ichimoku lines in one pass over the bars, without temporary frames
+        values = indicators.indicator_pass(self.data['High'], self.data['Low'], self.data['Close'],
+                                           ema_period=self.ema_period, atr_period=self.atr_period,
+                                           midline_periods=(self.conversion_period, self.base_period))
+        self.data['EMA'] = values['ema']
+        self.data['ATR'] = values['atr']
+        self.midlines = values['midline']
 
     def calculate_atr(self, period):
-        high_low = self.data['High'] - self.data['Low']
-        high_close = np.abs(self.data['High'] - self.data['Close'].shift())
-        low_close = np.abs(self.data['Low'] - self.data['Close'].shift())
-        true_range = pd.DataFrame({
-            'high_low': high_low,
-            'high_close': high_close,
-            'low_close': low_close
-        }).max(axis=1)
-        return true_range.rolling(window=period).mean()
-
-    def calculate_signals(self):
-        self.signals = pd.DataFrame(index=self.data.index)
-        self.signals['Signal'] = 0
-        self.signals['SL'] = 0.0
-        self.signals['TP'] = 0.0
-        
-        conversion_line = self.calculate_conversion_line()
-        base_line = self.calculate_base_line()
-
-        buy_condition = (conversion_line > base_line) & (self.data['Close'] > self.data['EMA'])
-        sell_condition = (conversion_line < base_line) & (self.data['Close'] < self.data['EMA'])
-
-        self.signals.loc[buy_condition, 'Signal'] = 1
-        self.signals.loc[sell_condition, 'Signal'] = -1
+        return pd.Series(indicators.atr(self.data['High'], self.data['Low'], self.data['Close'], period),
+                         index=self.data.index)
 
-        long_signals = self.signals['Signal'] == 1
-        short_signals = self.signals['Signal'] == -1
-
-        self.signals.loc[long_signals, 'SL'] = self.data.loc[long_signals, 'Close'] - (self.data.loc[long_signals, 'ATR'] * self.sl_atr_multiplier)
-        self.signals.loc[long_signals, 'TP'] = self.data.loc[long_signals, 'Close'] + (self.data.loc[long_signals, 'ATR'] * self.tp_atr_multiplier)
-        self.signals.loc[short_signals, 'SL'] = self.data.loc[short_signals, 'Close'] + (self.data.loc[short_signals, 'ATR'] * self.sl_atr_multiplier)
-        self.signals.loc[short_signals, 'TP'] = self.data.loc[short_signals, 'Close'] - (self.data.loc[short_signals, 'ATR'] * self.tp_atr_multiplier)
+    @profiler.instrument('cloud.calculate_signals', rows=lambda self, *args: len(self.data))
+    def calculate_signals(self, conversion_line=None, base_line=None):
+        # Precomputed conversion/base lines (e.g. from a shared indicator run) may be passed in
+        self.signals = pd.DataFrame(index=self.data.index)
+        if conversion_line is None:
+            conversion_line = self.calculate_conversion_line()
+        if base_line is None:
+            base_line = self.calculate_base_line()
+
+        conversion_line = np.asarray(conversion_line)
+        base_line = np.asarray(base_line)
+        close = self.data['Close'].to_numpy()
+        ema = self.data['EMA'].to_numpy()
+        atr = self.data['ATR'].to_numpy()
+        buy_condition = (conversion_line > base_line) & (close > ema)
+        sell_condition = (conversion_line < base_line) & (close < ema)
+
+        # Long: SL below and TP above the close; short: the other way round
+        side = np.where(buy_condition, 1, np.where(sell_condition, -1, 0))
+        self.signals['Signal'] = side
+        self.signals['SL'] = np.where(side != 0, close - side * atr * self.sl_atr_multiplier, 0.0)
+        self.signals['TP'] = np.where(side != 0, close + side * atr * self.tp_atr_multiplier, 0.0)
+
+    def get_midline(self, period):
+        # From calculate_indicators when it covered this period, otherwise from the range index
+        midline = self.midlines.get(period)
+        if midline is None or len(midline) != len(self.data):
+            midline = self.get_range_index().midline(period)
+        return pd.Series(midline, index=self.data.index)
 
     def calculate_conversion_line(self):
-        high = self.data['High'].rolling(window=self.conversion_period).max()
-        low = self.data['Low'].rolling(window=self.conversion_period).min()
-        return (high + low) / 2
+        return self.get_midline(self.conversion_period)
 
     def calculate_base_line(self):
-        high = self.data['High'].rolling(window=self.base_period).max()
-        low = self.data['Low'].rolling(window=self.base_period).min()
-        return (high + low) / 2
-
-    def calculate_returns(self):
-        returns = pd.Series(index=self.signals.index)
-        position = 0  # Track if we are in a position (1 for long, -1 for short)
-        entry_price = 0
-        
-        for i in range(1, len(self.signals)):
-            if position == 0:  # No open position
-                if self.signals['Signal'].iloc[i] == 1:  # Buy signal
-                    position = 1
-                    entry_price = self.data['Close'].iloc[i]
-                elif self.signals['Signal'].iloc[i] == -1:  # Sell signal
-                    position = -1
-                    entry_price = self.data['Close'].iloc[i]
-            elif position == 1:  # Long position
-                if self.data['Low'].iloc[i] <= self.signals['SL'].iloc[i-1]:  # Stop loss hit
-                    returns.iloc[i] = (self.signals['SL'].iloc[i-1] - entry_price) / entry_price
-                    position = 0  # Close position
-                elif self.data['High'].iloc[i] >= self.signals['TP'].iloc[i-1]:  # Take profit hit
-                    returns.iloc[i] = (self.signals['TP'].iloc[i-1] - entry_price) / entry_price
-                    position = 0  # Close position
-                elif self.signals['Signal'].iloc[i] == -1:  # New sell signal
-                    returns.iloc[i] = (self.data['Close'].iloc[i] - entry_price) / entry_price
-                    position = -1  # Switch to short position
-                    entry_price = self.data['Close'].iloc[i]
-            elif position == -1:  # Short position
-                if self.data['High'].iloc[i] >= self.signals['SL'].iloc[i-1]:  # Stop loss hit
-                    returns.iloc[i] = (entry_price - self.signals['SL'].iloc[i-1]) / entry_price
-                    position = 0  # Close position
-                elif self.data['Low'].iloc[i] <= self.signals['TP'].iloc[i-1]:  # Take profit hit
-                    returns.iloc[i] = (entry_price - self.signals['TP'].iloc[i-1]) / entry_price
-                    position = 0  # Close position
-                elif self.signals['Signal'].iloc[i] == 1:  # New buy signal
-                    returns.iloc[i] = (entry_price - self.data['Close'].iloc[i]) / entry_price
-                    position = 1  # Switch to long position
-                    entry_price = self.data['Close'].iloc[i]
-        
-        return returns
+        return self.get_midline(self.base_period)
+
+    def start_stream(self):
+        # Incremental indicators for running the strategy bar by bar, like OnBar in the cTrader bot
+        self.stream = {
+            'ema': EMA(self.ema_period),
+            'atr': ATR(self.atr_period),
+            'conversion': DonchianMidline(self.conversion_period),
+            'base': DonchianMidline(self.base_period),
+        }
+
+    def on_bar(self, bar):
+        # Signal, SL and TP for one new bar, matching calculate_signals without recomputing history
+        if self.stream is None:
+            self.start_stream()
+        ema = self.stream['ema'].update(bar)
+        atr = self.stream['atr'].update(bar)
+        conversion_line = self.stream['conversion'].update(bar)
+        base_line = self.stream['base'].update(bar)
+        close = bar['Close']
+
+        if conversion_line > base_line and close > ema:
+            return 1, close - atr * self.sl_atr_multiplier, close + atr * self.tp_atr_multiplier
+        if conversion_line < base_line and close < ema:
+            return -1, close + atr * self.sl_atr_multiplier, close - atr * self.tp_atr_multiplier
+        return 0, 0.0, 0.0
+
+    @profiler.instrument('cloud.calculate_returns', rows=lambda self, *args, **kwargs: len(self.data))
+    def calculate_returns(self, intrabar=None):
+        # SL/TP from the previous bar, reversal on an opposite signal. An intrabar resolver
+        # re-decides bars that touched both SL and TP from lower-timeframe bars
+        result = run_backtest(self.data['Close'], self.data['High'], self.data['Low'],
+                              self.signals['Signal'], self.signals['SL'], self.signals['TP'],
+                              stops='previous_bar', on_opposite='reverse', start=1,
+                              index=bar_times(self.data) if intrabar is not None else None, intrabar=intrabar)
+        self.trades = result.trades
+        return pd.Series(result.returns, index=self.signals.index)
 
 if __name__ == "__main__":
-    # Load data from local CSV file
-    data = pd.read_csv("./nas100_1h.csv")  # Update the path to your CSV file
-    
     # Initialize strategy parameters
     strategy = IchimokuCloudStrategy()
     
@@ -130,12 +154,18 @@ if __name__ == "__main__":
     # Ensure strategy_returns does not contain NaN values
     strategy_returns = strategy_returns.dropna()
 
-    print(f"Number of trades: {len(strategy_returns[strategy_returns != 0])}")
-    print(f"Total return: {strategy_returns.sum():.2%}")
+    metrics = trade_metrics(strategy.trades, n_bars=len(strategy.data))
+    print(f"Number of trades: {metrics['trades']}")
+    print(f"Total return: {metrics['total']:.2%}")
+    print(f"Win rate: {metrics['win_rate']:.2%} | Profit factor: {metrics['profit_factor']:.2f} | "
+          f"Expectancy: {metrics['expectancy']:.3%}")
+    print(f"Max drawdown: {metrics['max_drawdown']:.2%} over {metrics['drawdown_duration']} trades | "
+          f"Exposure: {metrics['exposure']:.2%}")
 
-    # Run simple Monte Carlo simulation using pandas-montecarlo
+    # Run simple Monte Carlo simulation over the trade returns
     if not strategy_returns.empty:
-        mc_results = strategy_returns.montecarlo(sims=1000, bust=-0.1, goal=0.5)
+        with profiler.stage('cloud.montecarlo', rows=len(strategy_returns)):
+            mc_results = montecarlo(strategy_returns, sims=1000, bust=-0.1, goal=0.5)
 
         # Print Monte Carlo statistics
         print("\nMonte Carlo Simulation Results:")
@@ -144,6 +174,9 @@ if __name__ == "__main__":
         print(f"Standard Deviation: {mc_results.stats['std']:.2%}")
         print(f"Minimum Return: {mc_results.stats['min']:.2%}")
         print(f"Maximum Return: {mc_results.stats['max']:.2%}")
+        print(f"Worst Drawdown: {mc_results.stats['maxdd']:.2%}")
+        print(f"Bust Probability: {mc_results.stats['bust']:.2%}")
+        print(f"Goal Probability: {mc_results.stats['goal']:.2%}")
 
         # Plot the Monte Carlo simulations
         mc_results.plot(title="Strategy Returns Monte Carlo Simulations")
@@ -0,0 +1,200 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.bar_store import read_bars
+from common.kernel import EXIT_SIGNAL, EXIT_STOP_LOSS, EXIT_TAKE_PROFIT, TRADE_DTYPE, njit
+from common.range_index import DonchianIndex
+
+# Replays bars through a port of realbot_code/cloud_with_atrTPSL.
+#
+# cTrader calls OnBar when a new bar opens, so at bar i the bot sees the completed
+# bars before it plus the just-opened bar, whose high, low and close all equal its
+# open. Market orders fill at that open, SL/TP are whole pips from the fill, and
+# a bar that touches both SL and TP is assumed to hit the stop first.
+
+
+def onbar_indicators(open_, high, low, close, ema_period, conversion_period, base_period, atr_period):
+    """Conversion line, base line, EMA and ATR as the bot sees them in OnBar at each bar."""
+    n = len(open_)
+    index = DonchianIndex(high, low, max_window=max(conversion_period, base_period))
+
+    def midline(period):
+        # The just-opened bar adds its open to the lookback over the previous period - 1 bars
+        if period == 1:
+            return open_.copy()
+        highest = np.fmax(index.highest(period - 1, closed='left'), open_)
+        lowest = np.fmin(index.lowest(period - 1, closed='left'), open_)
+        line = (highest + lowest) / 2
+        line[:period - 1] = np.nan
+        return line
+
+    # EMA of the closes, with the current value taken at the new bar's open
+    alpha = 2.0 / (ema_period + 1)
+    ema_closed = pd.Series(close).ewm(span=ema_period, adjust=False).mean().to_numpy()
+    ema = np.empty(n)
+    ema[0] = open_[0]
+    ema[1:] = ema_closed[:-1] + alpha * (open_[1:] - ema_closed[:-1])
+
+    # Simple ATR over the previous atr_period - 1 true ranges plus the new bar's
+    previous_close = np.r_[np.nan, close[:-1]]
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    opening_range = np.abs(open_ - previous_close)
+    opening_range[0] = 0.0
+    sums = np.r_[0.0, np.cumsum(true_range)]
+    i = np.arange(n)
+    start = np.maximum(i - atr_period + 1, 0)
+    atr = (sums[i] - sums[start] + opening_range) / atr_period
+    atr[:atr_period - 1] = np.nan
+
+    return midline(conversion_period), midline(base_period), ema, atr
+
+
+@njit(cache=True)
+def _replay(open_, high, low, signal, sl_pips, tp_pips, pip_size, warmup, trades):
+    position = 0
+    entry_price = 0.0
+    entry_index = 0
+    stop_level = 0.0
+    target_level = 0.0
+    n_trades = 0
+
+    for i in range(warmup, len(open_)):
+        price = open_[i]
+
+        # A gap through SL/TP fills at the new bar's open before OnBar runs
+        if position != 0:
+            reason = 0
+            if position * (price - stop_level) <= 0:
+                reason = EXIT_STOP_LOSS
+            elif position * (price - target_level) >= 0:
+                reason = EXIT_TAKE_PROFIT
+            if reason != 0:
+                trades[n_trades, 0] = entry_index
+                trades[n_trades, 1] = i
+                trades[n_trades, 2] = position
+                trades[n_trades, 3] = entry_price
+                trades[n_trades, 4] = price
+                trades[n_trades, 5] = reason
+                n_trades += 1
+                position = 0
+
+        # OnBar: close on an opposite signal, otherwise open on a new signal
+        s = signal[i]
+        if position != 0:
+            if s == -position:
+                trades[n_trades, 0] = entry_index
+                trades[n_trades, 1] = i
+                trades[n_trades, 2] = position
+                trades[n_trades, 3] = entry_price
+                trades[n_trades, 4] = price
+                trades[n_trades, 5] = EXIT_SIGNAL
+                n_trades += 1
+                position = 0
+                continue
+        elif s != 0:
+            position = s
+            entry_price = price
+            entry_index = i
+            # Zero pips means no protective order
+            stop_level = price - s * sl_pips[i] * pip_size if sl_pips[i] > 0 else -s * np.inf
+            target_level = price + s * tp_pips[i] * pip_size if tp_pips[i] > 0 else s * np.inf
+
+        # Intrabar: SL/TP orders sitting on the server
+        if position != 0:
+            if position == 1:
+                hit_stop = low[i] <= stop_level
+                hit_target = high[i] >= target_level
+            else:
+                hit_stop = high[i] >= stop_level
+                hit_target = low[i] <= target_level
+            if hit_stop or hit_target:
+                trades[n_trades, 0] = entry_index
+                trades[n_trades, 1] = i
+                trades[n_trades, 2] = position
+                trades[n_trades, 3] = entry_price
+                trades[n_trades, 4] = stop_level if hit_stop else target_level
+                trades[n_trades, 5] = EXIT_STOP_LOSS if hit_stop else EXIT_TAKE_PROFIT
+                n_trades += 1
+                position = 0
+
+    return n_trades
+
+
+class CloudBotReplay:
+    """Replays bars through the cloud_with_atrTPSL OnBar logic with simulated fills."""
+
+    def __init__(self, ema_period=50, conversion_period=9, base_period=26, atr_period=14,
+                 sl_atr_multiplier=2.0, tp_atr_multiplier=1.5, atr_scaling_factor=0.1,
+                 pip_size=0.0001, volume=1.0):
+        self.ema_period = ema_period
+        self.conversion_period = conversion_period
+        self.base_period = base_period
+        self.atr_period = atr_period
+        self.sl_atr_multiplier = sl_atr_multiplier
+        self.tp_atr_multiplier = tp_atr_multiplier
+        self.atr_scaling_factor = atr_scaling_factor
+        self.pip_size = pip_size
+        self.volume = volume  # Units traded per position
+
+    def signals(self, open_, high, low, close):
+        conversion_line, base_line, ema, atr = onbar_indicators(
+            open_, high, low, close, self.ema_period, self.conversion_period, self.base_period, self.atr_period)
+        # GetSignal compares against the current (opening) price
+        signal = np.where((conversion_line > base_line) & (open_ > ema), 1,
+                          np.where((conversion_line < base_line) & (open_ < ema), -1, 0))
+        # (int)Math.Round(...) rounds half to even, like np.rint
+        atr_value = atr * self.atr_scaling_factor
+        with np.errstate(invalid='ignore'):
+            sl_pips = np.nan_to_num(np.rint(atr_value * self.sl_atr_multiplier / self.pip_size)).astype(np.int64)
+            tp_pips = np.nan_to_num(np.rint(atr_value * self.tp_atr_multiplier / self.pip_size)).astype(np.int64)
+        return signal.astype(np.int64), sl_pips, tp_pips
+
+    def run(self, bars):
+        open_, high, low, close = (np.ascontiguousarray(bars[c], dtype=np.float64)
+                                   for c in ('Open', 'High', 'Low', 'Close'))
+        signal, sl_pips, tp_pips = self.signals(open_, high, low, close)
+        # OnBar returns early while Bars.Count < max(periods) + 1
+        warmup = max(self.conversion_period, self.base_period, self.atr_period)
+        raw = np.empty((len(open_), 6))
+        n_trades = _replay(open_, high, low, signal, sl_pips, tp_pips, self.pip_size, warmup, raw)
+
+        trades = np.zeros(n_trades, dtype=TRADE_DTYPE)
+        for column, name in enumerate(TRADE_DTYPE.names[:raw.shape[1]]):
+            trades[name] = raw[:n_trades, column]
+        return trades
+
+    def summary(self, trades):
+        pips = trades['side'] * (trades['exit_price'] - trades['entry_price']) / self.pip_size
+        return {
+            'trades': len(trades),
+            'net_pips': float(pips.sum()),
+            'net_pnl': float((pips * self.pip_size * self.volume).sum()),
+            'win_rate': float((pips > 0).mean()) if len(trades) else 0.0,
+            'stop_losses': int((trades['reason'] == EXIT_STOP_LOSS).sum()),
+            'take_profits': int((trades['reason'] == EXIT_TAKE_PROFIT).sum()),
+            'signal_closes': int((trades['reason'] == EXIT_SIGNAL).sum()),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay bar files through the cloud_with_atrTPSL bot logic.")
+    parser.add_argument('files', nargs='+', help="Price CSV files, one per symbol")
+    parser.add_argument('--pip-size', type=float, default=0.0001)
+    parser.add_argument('--volume', type=float, default=1.0)
+    args = parser.parse_args()
+
+    replay = CloudBotReplay(pip_size=args.pip_size, volume=args.volume)
+    for path in args.files:
+        bars = read_bars(path)
+        start = time.perf_counter()
+        trades = replay.run(bars)
+        elapsed = time.perf_counter() - start
+        print(f"{os.path.basename(path)}: {len(bars)} bars in {elapsed:.3f}s "
+              f"({len(bars) / max(elapsed, 1e-9):,.0f} bars/s)")
+        print(f"  {replay.summary(trades)}")
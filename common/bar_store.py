@@ -0,0 +1,163 @@
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from common.bars import Bars
+from common.pyramid import Pyramid
+from common.result_cache import ResultCache
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+
+def read_price_csv(path):
+    """Parse a yfinance CSV (classic single header or the newer Price/Ticker header)."""
+    with open(path) as f:
+        head = [f.readline() for _ in range(3)]
+    if head[1].startswith('Ticker'):
+        frame = pd.read_csv(path, header=0, skiprows=[1, 2], index_col=0)
+    else:
+        frame = pd.read_csv(path, index_col=0)
+    return normalize_bars(frame)
+
+
+def normalize_bars(frame):
+    # UTC DatetimeIndex, float columns, sorted, one row per timestamp, no NaN rows
+    frame = frame.copy()
+    frame.index = pd.to_datetime(frame.index, utc=True)
+    frame.index.name = 'Datetime'
+    columns = [c for c in PRICE_COLUMNS if c in frame.columns]
+    frame = frame[columns].astype(np.float64)
+    frame = frame[~frame.index.duplicated(keep='last')].sort_index()
+    return frame.dropna()
+
+
+class BarStore:
+    """Bars persisted as raw .npy files so loading a symbol is a memory map, not a parse.
+
+    Each symbol directory holds values.npy (rows x columns float64), index.npy
+    (int64 nanoseconds since the epoch, UTC) and meta.json.
+    """
+
+    def __init__(self, root='.bars'):
+        self.root = root
+
+    def path(self, symbol):
+        return os.path.join(self.root, re.sub(r'[^A-Za-z0-9_.-]', '_', symbol))
+
+    def has(self, symbol):
+        return os.path.exists(os.path.join(self.path(symbol), 'meta.json'))
+
+    def symbols(self):
+        # Base symbols only; pyramid levels ('<symbol>@<timeframe>') are left out
+        symbols = []
+        if os.path.isdir(self.root):
+            for name in sorted(os.listdir(self.root)):
+                meta_path = os.path.join(self.root, name, 'meta.json')
+                if os.path.exists(meta_path):
+                    with open(meta_path) as f:
+                        meta = json.load(f)
+                    if 'timeframe' not in (meta.get('source') or {}):
+                        symbols.append(meta['symbol'])
+        return symbols
+
+    def result_cache(self, max_bytes=64 * 1024 ** 2):
+        # Backtest results computed on this store's bars, dropped per symbol when its bars are rewritten
+        return ResultCache(os.path.join(self.root, 'results.sqlite'), max_bytes)
+
+    def meta(self, symbol):
+        with open(os.path.join(self.path(symbol), 'meta.json')) as f:
+            return json.load(f)
+
+    def write(self, symbol, frame, source=None):
+        frame = normalize_bars(frame)
+        path = self.path(symbol)
+        os.makedirs(path, exist_ok=True)
+        # Write to temporary files first so readers never map a half-written symbol
+        np.save(os.path.join(path, 'values.tmp.npy'), np.ascontiguousarray(frame.to_numpy(dtype=np.float64)))
+        np.save(os.path.join(path, 'index.tmp.npy'), frame.index.as_unit('ns').asi8)
+        meta = {'symbol': symbol, 'columns': list(frame.columns), 'rows': len(frame), 'source': source}
+        with open(os.path.join(path, 'meta.tmp.json'), 'w') as f:
+            json.dump(meta, f)
+        for name in ('values.npy', 'index.npy', 'meta.json'):
+            stem, ext = os.path.splitext(name)
+            os.replace(os.path.join(path, f'{stem}.tmp{ext}'), os.path.join(path, name))
+        if os.path.exists(os.path.join(self.root, 'results.sqlite')):
+            cache = self.result_cache()
+            cache.invalidate(symbol)
+            cache.close()
+        return meta
+
+    def ingest_csv(self, symbol, csv_path):
+        stat = os.stat(csv_path)
+        source = {'path': os.path.abspath(csv_path), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+        return self.write(symbol, read_price_csv(csv_path), source)
+
+    def is_current(self, symbol, csv_path):
+        # True when the stored bars were ingested from this exact CSV
+        if not self.has(symbol):
+            return False
+        source = self.meta(symbol).get('source') or {}
+        stat = os.stat(csv_path)
+        return (source.get('path') == os.path.abspath(csv_path) and source.get('mtime_ns') == stat.st_mtime_ns
+                and source.get('size') == stat.st_size)
+
+    def load_arrays(self, symbol):
+        path = self.path(symbol)
+        values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+        index = np.load(os.path.join(path, 'index.npy'), mmap_mode='r')
+        return self.meta(symbol)['columns'], index, values
+
+    def bars(self, symbol):
+        # Bars over the memory maps, so time slices of them stay views too
+        columns, index, values = self.load_arrays(symbol)
+        return Bars(index, values, columns)
+
+    def load(self, symbol, start=None, end=None):
+        # DataFrame over the memory-mapped values (start <= time < end); nothing is read until it is used
+        return self.bars(symbol)[start:end].frame()
+
+    def first_timestamp(self, symbol):
+        if not self.has(symbol):
+            return None
+        index = self.load_arrays(symbol)[1]
+        return pd.Timestamp(int(index[0]), tz='UTC') if len(index) else None
+
+    def last_timestamp(self, symbol):
+        if not self.has(symbol):
+            return None
+        index = self.load_arrays(symbol)[1]
+        return pd.Timestamp(int(index[-1]), tz='UTC') if len(index) else None
+
+    def append(self, symbol, frame, source=None):
+        # Merge new bars into the stored ones; later rows win on duplicate timestamps
+        if self.has(symbol):
+            frame = pd.concat([self.load(symbol), normalize_bars(frame)])
+        return self.write(symbol, frame, source)
+
+
+def ingest_bars(csv_path, store=None):
+    """(store, symbol) for a price CSV, ingesting it only when it has changed.
+
+    The default store is a '.bars' folder next to the CSV.
+    """
+    if store is None:
+        store = BarStore(os.path.join(os.path.dirname(os.path.abspath(csv_path)), '.bars'))
+    symbol = os.path.splitext(os.path.basename(csv_path))[0]
+    if not store.is_current(symbol, csv_path):
+        store.ingest_csv(symbol, csv_path)
+    return store, symbol
+
+
+def read_bars(csv_path, store=None, timeframe=None):
+    """Load a price CSV through the bar store, ingesting it only when it has changed.
+
+    With a timeframe (e.g. '4h', '1D') the bars come from the symbol's pyramid
+    level instead, built or brought up to date on first use.
+    """
+    store, symbol = ingest_bars(csv_path, store)
+    if timeframe is not None:
+        return Pyramid(store, symbol, timeframes=[timeframe]).load(timeframe)
+    return store.load(symbol)
@@ -0,0 +1,221 @@
+import numbers
+
+import numpy as np
+import pandas as pd
+
+from common.kernel import njit
+
+
+def _ns(time):
+    # int64 nanoseconds since the epoch; naive times are taken as UTC
+    timestamp = pd.Timestamp(time)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize('UTC')
+    return timestamp.as_unit('ns').value
+
+
+def _utc_ns(times):
+    return pd.DatetimeIndex(times).tz_convert('UTC').as_unit('ns').asi8
+
+
+def _wall_ns(times, tz):
+    # Naive wall-clock times in `tz` (UTC when None) as int64 ns, UTC
+    times = pd.DatetimeIndex(times)
+    if tz is not None:
+        times = times.tz_localize(tz, ambiguous=True, nonexistent='shift_forward')
+    else:
+        times = times.tz_localize('UTC')
+    return _utc_ns(times)
+
+
+@njit(cache=True)
+def _merge_join(left, right):
+    # Positions of the timestamps present in both sorted indexes, in one linear walk
+    out_left = np.empty(min(len(left), len(right)), dtype=np.int64)
+    out_right = np.empty(len(out_left), dtype=np.int64)
+    i = j = n = 0
+    while i < len(left) and j < len(right):
+        if left[i] < right[j]:
+            i += 1
+        elif left[i] > right[j]:
+            j += 1
+        else:
+            out_left[n] = i
+            out_right[n] = j
+            n += 1
+            i += 1
+            j += 1
+    return out_left[:n], out_right[:n]
+
+
+@njit(cache=True)
+def _merge_asof(left, right):
+    # For each left timestamp, the last right position at or before it (-1 if none)
+    out = np.empty(len(left), dtype=np.int64)
+    j = -1
+    for i in range(len(left)):
+        while j + 1 < len(right) and right[j + 1] <= left[i]:
+            j += 1
+        out[i] = j
+    return out
+
+
+class Bars:
+    """Bars as a (rows x columns) float64 matrix under a sorted int64 index (ns, UTC).
+
+    Selecting a time range is a binary search on the index and returns views of
+    both arrays, so bars[t0:t1] on memory-mapped minute data neither copies nor
+    reads the rows outside the range. Ranges are half-open: t0 <= time < t1.
+    Integer slices select rows by position, and bars['Close'] is a column view.
+    """
+
+    def __init__(self, index, values, columns):
+        self.index = index
+        self.values = values
+        self.columns = list(columns)
+
+    @classmethod
+    def from_frame(cls, frame, columns=None):
+        columns = list(frame.columns if columns is None else columns)
+        return cls(_utc_ns(frame.index), frame[columns].to_numpy(dtype=np.float64), columns)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        if not len(self):
+            return f'Bars(0 rows, columns={self.columns})'
+        return f'Bars({len(self)} rows, {self.start} .. {self.end}, columns={self.columns})'
+
+    @property
+    def start(self):
+        return pd.Timestamp(int(self.index[0]), tz='UTC') if len(self) else None
+
+    @property
+    def end(self):
+        return pd.Timestamp(int(self.index[-1]), tz='UTC') if len(self) else None
+
+    def times(self):
+        return pd.DatetimeIndex(np.asarray(self.index).view('datetime64[ns]'), name='Datetime').tz_localize('UTC')
+
+    def locate(self, time, side='left'):
+        """Row of the first bar at (side='left') or after (side='right') `time`."""
+        return int(np.searchsorted(self.index, _ns(time), side=side))
+
+    def _position(self, key, default):
+        if key is None:
+            return default
+        if isinstance(key, numbers.Integral):
+            return key
+        return self.locate(key)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.values[:, self.columns.index(key)]
+        if not isinstance(key, slice):
+            raise TypeError("Bars are indexed by a column name or a slice of times or rows")
+        if key.step is not None:
+            raise ValueError("Bars slices take no step")
+        return self.rows(self._position(key.start, 0), self._position(key.stop, len(self)))
+
+    def rows(self, start, stop):
+        return Bars(self.index[start:stop], self.values[start:stop], self.columns)
+
+    def between(self, start=None, end=None):
+        return self[start:end]
+
+    def frame(self):
+        # Zero-copy DataFrame over the same buffers, indexed like BarStore.load
+        return pd.DataFrame(self.values, index=self.times(), columns=self.columns, copy=False)
+
+    def take(self, positions):
+        """Bars at the given rows (a copy); position -1 gives a row of NaN."""
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(positions) and positions[0] >= 0:
+            first = int(positions[0])
+            if np.array_equal(positions, np.arange(first, first + len(positions))):
+                # A contiguous run is just a slice
+                return self.rows(first, first + len(positions))
+        missing = positions < 0
+        index = np.asarray(self.index)[positions]
+        values = np.asarray(self.values)[positions]
+        values[missing] = np.nan
+        return Bars(index, values, self.columns)
+
+    def select(self, mask):
+        return self.take(np.flatnonzero(mask))
+
+    def periods(self, freq='YS', tz=None):
+        """(period start, bars) for each calendar period with bars, e.g. 'YS' for
+        years, 'MS' months, 'W-MON' weeks, 'D' days (midnight in `tz`).
+
+        The bars are views: period boundaries are found by binary search, one
+        per period, so splitting years of minute data touches no rows.
+        """
+        if not len(self):
+            return
+        first, last = self.start, self.end
+        if tz is not None:
+            first, last = first.tz_convert(tz), last.tz_convert(tz)
+        first, last = first.tz_localize(None), last.tz_localize(None)
+        offset = pd.tseries.frequencies.to_offset(freq)
+        edges = pd.date_range(offset.rollback(first.normalize()), last + offset, freq=offset)
+        cuts = np.searchsorted(self.index, _wall_ns(edges, tz))
+        labels = edges.tz_localize(tz or 'UTC', ambiguous=True, nonexistent='shift_forward')
+        for label, a, b in zip(labels, cuts[:-1], cuts[1:]):
+            if b > a:
+                yield label, self.rows(int(a), int(b))
+
+    def _session_bounds(self, start, end, tz, weekdays):
+        start, end = pd.Timedelta(start), pd.Timedelta(end)
+        if end <= start:
+            end += pd.Timedelta('1D')
+        first, last = self.start, self.end
+        if tz is not None:
+            first, last = first.tz_convert(tz), last.tz_convert(tz)
+        # Local wall-clock days, so sessions keep their hours across daylight saving changes
+        days = pd.date_range(first.tz_localize(None).normalize() - pd.Timedelta('1D'),
+                             last.tz_localize(None).normalize(), freq='D')
+        if weekdays is not None:
+            days = days[np.isin(days.weekday, list(weekdays))]
+        opens = np.searchsorted(self.index, _wall_ns(days + start, tz))
+        closes = np.searchsorted(self.index, _wall_ns(days + end, tz))
+        return days.tz_localize(tz or 'UTC', ambiguous=True, nonexistent='shift_forward'), opens, closes
+
+    def sessions(self, start='0h', end='24h', tz=None, weekdays=None):
+        """(date, bars) for each day's session from `start` to `end` after
+        midnight in `tz`, as views. An `end` at or before `start` runs into the
+        next day (e.g. start='17h', end='17h' for FX days in New York time).
+        `weekdays` (0 = Monday) keeps only sessions starting on those days.
+        """
+        if not len(self):
+            return
+        for day, a, b in zip(*self._session_bounds(start, end, tz, weekdays)):
+            if b > a:
+                yield day, self.rows(int(a), int(b))
+
+    def session_mask(self, start='0h', end='24h', tz=None, weekdays=None):
+        # Boolean row mask of the same sessions, e.g. to switch signals off outside them
+        mask = np.zeros(len(self), dtype=bool)
+        if len(self):
+            _, opens, closes = self._session_bounds(start, end, tz, weekdays)
+            for a, b in zip(opens, closes):
+                mask[a:b] = True
+        return mask
+
+    def align(self, other, how='inner'):
+        """These bars and `other` on a shared time axis, by a merge-join of the
+        two sorted indexes.
+
+        'inner' keeps the timestamps both have. 'asof' keeps every bar here and
+        pairs it with the last bar of `other` at or before it (NaN before the
+        first one). Rows that stay contiguous come back as views.
+        """
+        left, right = np.asarray(self.index), np.asarray(other.index)
+        if how == 'inner':
+            left_at, right_at = _merge_join(left, right)
+            return self.take(left_at), other.take(right_at)
+        if how == 'asof':
+            matched = other.take(_merge_asof(left, right))
+            return self, Bars(self.index, matched.values, other.columns)
+        raise ValueError("how must be 'inner' or 'asof'")
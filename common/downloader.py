@@ -0,0 +1,180 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from common.bar_store import BarStore, normalize_bars
+
+
+class YahooProvider:
+    """Fetches bars with yfinance, one request per chunk."""
+
+    # Longest range Yahoo serves per intraday request, and how far back it goes
+    chunk_days = {'1m': 7, '2m': 59, '5m': 59, '15m': 59, '30m': 59, '60m': 365, '90m': 59, '1h': 365}
+    history_days = {'1m': 29, '2m': 59, '5m': 59, '15m': 59, '30m': 59, '60m': 729, '90m': 59, '1h': 729}
+
+    def chunk_span(self, interval):
+        days = self.chunk_days.get(interval)
+        return pd.Timedelta(days=days) if days else None
+
+    def earliest(self, interval, now):
+        days = self.history_days.get(interval)
+        return now - pd.Timedelta(days=days) if days else pd.Timestamp('1970-01-01', tz='UTC')
+
+    def fetch(self, ticker, start, end, interval):
+        import yfinance as yf
+
+        data = yf.download(ticker, start=start, end=end, interval=interval, progress=False, auto_adjust=False)
+        if isinstance(data.columns, pd.MultiIndex):
+            data = data.xs(ticker, axis=1, level='Ticker')
+        return data
+
+
+class FrameProvider:
+    """Serves bars from in-memory DataFrames; stands in for Yahoo in tests."""
+
+    def __init__(self, frames, chunk_days=None, history_days=None):
+        self.frames = {ticker: normalize_bars(frame) for ticker, frame in frames.items()}
+        self.chunk_days = chunk_days
+        self.history_days = history_days
+        self.calls = []
+
+    def chunk_span(self, interval):
+        return pd.Timedelta(days=self.chunk_days) if self.chunk_days else None
+
+    def earliest(self, interval, now):
+        if self.history_days:
+            return now - pd.Timedelta(days=self.history_days)
+        return pd.Timestamp('1970-01-01', tz='UTC')
+
+    def fetch(self, ticker, start, end, interval):
+        self.calls.append((ticker, start, end, interval))
+        frame = self.frames[ticker]
+        return frame[(frame.index >= start) & (frame.index < end)]
+
+
+class RateLimiter:
+    # Spaces out requests shared by all download threads
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _utc(value):
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+
+
+class Downloader:
+    """Keeps a local bar store up to date, fetching only the bars it does not have yet."""
+
+    def __init__(self, store=None, provider=None, max_workers=4, retries=3, backoff=1.0,
+                 requests_per_second=2.0):
+        self.store = store if store is not None else BarStore()
+        self.provider = provider if provider is not None else YahooProvider()
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = RateLimiter(requests_per_second)
+
+    @staticmethod
+    def symbol(ticker, interval):
+        return f'{ticker}_{interval}'
+
+    def missing_ranges(self, ticker, interval, start=None, end=None):
+        # The requested range minus what the store holds: a head before the first
+        # stored bar and a tail after the last one
+        now = pd.Timestamp.now(tz='UTC')
+        end = _utc(end) if end is not None else now
+        earliest = self.provider.earliest(interval, now)
+        start = max(_utc(start), earliest) if start is not None else earliest
+        symbol = self.symbol(ticker, interval)
+        first, last = self.store.first_timestamp(symbol), self.store.last_timestamp(symbol)
+        if last is None:
+            return [(start, end)]
+        ranges = []
+        if start < first:
+            ranges.append((start, min(first, end)))
+        # Refetch the last stored bar too, it may have been partial
+        ranges.append((max(start, last), end))
+        return ranges
+
+    def chunks(self, start, end, interval):
+        span = self.provider.chunk_span(interval)
+        if span is None:
+            return [(start, end)] if start < end else []
+        ranges = []
+        while start < end:
+            ranges.append((start, min(start + span, end)))
+            start += span
+        return ranges
+
+    def _fetch(self, ticker, start, end, interval):
+        for attempt in range(self.retries + 1):
+            self.limiter.wait()
+            try:
+                return self.provider.fetch(ticker, start, end, interval)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                print(f"Retrying {ticker} {start:%Y-%m-%d}..{end:%Y-%m-%d} after error: {e}")
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def update(self, tickers, interval='1h', start=None, end=None):
+        """Fetch the bars each ticker is missing in the range and append them to the store.
+
+        Returns the number of bars fetched per ticker. If chunks of some tickers
+        still fail after the retries, the other tickers are stored first and a
+        RuntimeError then names the failed ones.
+        """
+        if isinstance(tickers, str):
+            tickers = [tickers]
+        jobs = []
+        for ticker in tickers:
+            for first, last in self.missing_ranges(ticker, interval, start, end):
+                jobs += [(ticker, a, b) for a, b in self.chunks(first, last, interval)]
+
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            futures = [pool.submit(self._fetch, ticker, a, b, interval) for ticker, a, b in jobs]
+
+        fetched = {ticker: [] for ticker in tickers}
+        errors = {}
+        for (ticker, _, _), future in zip(jobs, futures):
+            try:
+                frame = future.result()
+            except Exception as e:
+                errors.setdefault(ticker, e)
+                continue
+            if frame is not None and len(frame):
+                fetched[ticker].append(frame)
+        # A ticker with a failed chunk stores nothing, so no gap is left behind its last bar;
+        # the others are kept before the failures are raised
+        counts = {}
+        for ticker, frames in fetched.items():
+            if ticker in errors:
+                continue
+            counts[ticker] = sum(len(frame) for frame in frames)
+            if frames:
+                self.store.append(self.symbol(ticker, interval), pd.concat(frames))
+        if errors:
+            failed = ', '.join(f"{ticker} ({error!r})" for ticker, error in errors.items())
+            raise RuntimeError(f"Download failed for {failed}; stored {sorted(counts)}") from next(iter(errors.values()))
+        return counts
+
+    def load(self, ticker, interval='1h', start=None, end=None):
+        # Bring the cache up to date, then return the requested range from it
+        self.update([ticker], interval, start, end)
+        symbol = self.symbol(ticker, interval)
+        if not self.store.has(symbol):
+            return pd.DataFrame()
+        return self.store.load(symbol, start, end)
@@ -0,0 +1,102 @@
+import numpy as np
+
+from common.range_index import DonchianIndex
+
+
+def fractal_masks(high, low, window, index=None):
+    """Bullish/bearish fractal masks as defined in william/fractal_test.py.
+
+    A bar is a bullish (bearish) fractal when its low (high) is strictly below
+    (above) every low (high) of the `window` bars on each side of it. Pass a
+    DonchianIndex to reuse its tables across window sizes.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    n = len(high)
+    bullish = np.zeros(n, dtype=bool)
+    bearish = np.zeros(n, dtype=bool)
+    if n < 2 * window + 1:
+        return bullish, bearish
+    if index is None:
+        index = DonchianIndex(high, low, max_window=window)
+
+    # Extremes of the `window` bars before and after each bar
+    center = slice(window, n - window)
+    lows_before = index.lowest(window, closed='left')[center]
+    lows_after = index.lowest(window)[2 * window:]
+    highs_before = index.highest(window, closed='left')[center]
+    highs_after = index.highest(window)[2 * window:]
+
+    bullish[center] = (low[center] < lows_before) & (low[center] < lows_after)
+    bearish[center] = (high[center] > highs_before) & (high[center] > highs_after)
+    return bullish, bearish
+
+
+def four_point_fractal_masks(high, low, window):
+    """Fractal masks as defined in william/fractal.py.
+
+    The center bar is compared with bars i-window, i-window+1, i+1 and i+window only.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    n = len(high)
+    bullish = np.zeros(n, dtype=bool)
+    bearish = np.zeros(n, dtype=bool)
+    if n <= 2 * window:
+        return bullish, bearish
+
+    i = np.arange(window, n - window)
+    neighbours = (i - window, i - window + 1, i + 1, i + window)
+    bearish[i] = np.logical_and.reduce([high[i] > high[j] for j in neighbours])
+    bullish[i] = np.logical_and.reduce([low[i] < low[j] for j in neighbours])
+    return bullish, bearish
+
+
+def _loop_fractal_masks(high, low, window):
+    # Reference definition: a bar is a fractal when its low (high) is strictly below (above)
+    # the `window` bars on either side. These are the per-bar loops fractal_test.py used to run.
+    n = len(high)
+    bullish = np.zeros(n, dtype=bool)
+    bearish = np.zeros(n, dtype=bool)
+    for i in range(window, n - window):
+        bullish[i] = all(low[i - j] > low[i] and low[i + j] > low[i] for j in range(1, window + 1))
+        bearish[i] = all(high[i - j] < high[i] and high[i + j] < high[i] for j in range(1, window + 1))
+    return bullish, bearish
+
+
+def _loop_four_point_fractal_masks(high, low, window):
+    # Reference definition: the per-bar loop fractal.py used to run
+    n = len(high)
+    bullish = np.zeros(n, dtype=bool)
+    bearish = np.zeros(n, dtype=bool)
+    for i in range(window, n - window):
+        bearish[i] = (high[i] > high[i - window] and high[i] > high[i - window + 1] and
+                      high[i] > high[i + 1] and high[i] > high[i + window])
+        bullish[i] = (low[i] < low[i - window] and low[i] < low[i - window + 1] and
+                      low[i] < low[i + 1] and low[i] < low[i + window])
+    return bullish, bearish
+
+
+def check_parity(n=20000, windows=range(1, 11), seed=0):
+    """Compare the vectorized masks with the loop definitions on random bars.
+
+    Prices are rounded so that equal neighbouring highs/lows (ties) occur too.
+    """
+    rng = np.random.default_rng(seed)
+    close = np.round(100 + np.cumsum(rng.normal(0, 0.5, n)), 1)
+    high = close + np.round(rng.random(n), 1)
+    low = close - np.round(rng.random(n), 1)
+    index = DonchianIndex(high, low, max_window=max(windows))
+    for window in windows:
+        for got, expected in ((fractal_masks(high, low, window, index), _loop_fractal_masks(high, low, window)),
+                              (four_point_fractal_masks(high, low, window),
+                               _loop_four_point_fractal_masks(high, low, window))):
+            for mask, reference in zip(got, expected):
+                if not np.array_equal(mask, reference):
+                    raise AssertionError(f"fractal masks differ from the loop definition for window {window}")
+    return True
+
+
+if __name__ == "__main__":
+    check_parity()
+    print("Vectorized fractal masks match the loop definitions.")
@@ -0,0 +1,86 @@
+import hashlib
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _owner(array):
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+class IndicatorCache:
+    """LRU cache of indicator arrays keyed by (input fingerprint, indicator, params).
+
+    Inputs are treated as immutable: a series is hashed once and its fingerprint
+    is reused for as long as the array owning its memory is alive.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._fingerprints = {}
+
+    def fingerprint(self, values):
+        # Key on the input's own memory so strided column views are recognized too
+        array = np.asarray(values, dtype=np.float64)
+        address = array.__array_interface__['data'][0]
+        key = (address, array.shape, array.strides)
+        owner = _owner(array)
+        known = self._fingerprints.get(key)
+        if known is not None and known[0]() is owner:
+            return known[1]
+
+        digest = hashlib.blake2b(np.ascontiguousarray(array), digest_size=16).hexdigest()
+        self._fingerprints[key] = (weakref.ref(owner), digest)
+        if len(self._fingerprints) > 4096:
+            self._fingerprints = {k: v for k, v in self._fingerprints.items() if v[0]() is not None}
+        return digest
+
+    def compute(self, func, *inputs, **params):
+        """Return func(*inputs, **params), computing it only on a cache miss."""
+        key = (func.__module__, func.__qualname__,
+               tuple(self.fingerprint(x) for x in inputs), tuple(sorted(params.items())))
+        result = self.entries.get(key)
+        if result is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return result
+
+        self.misses += 1
+        result = np.asarray(func(*inputs, **params))
+        result.flags.writeable = False
+        if result.nbytes <= self.max_bytes:
+            self.entries[key] = result
+            self.current_bytes += result.nbytes
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+        return result
+
+    def clear(self):
+        self.entries.clear()
+        self._fingerprints.clear()
+        self.current_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.current_bytes,
+        }
+
+
+# Shared by the strategy scripts so repeated optimizer trials reuse indicators
+default_cache = IndicatorCache()
@@ -0,0 +1,240 @@
+import numpy as np
+import pandas as pd
+
+from common.kernel import HAVE_NUMBA, njit
+
+_NO_VALUES = np.empty(0)
+_NO_LINES = np.empty((0, 0))
+
+
+def _series(values):
+    return values if isinstance(values, pd.Series) else pd.Series(np.asarray(values, dtype=np.float64))
+
+
+@njit(cache=True, error_model='numpy')
+def _fused_pass(high, low, close, ema_period, atr_period, range_only, windows, fisher_period,
+                ema_out, true_range_out, atr_out, midline_out, fisher_out):
+    # One pass over the bars; False means a NaN input was met and nothing is usable
+    n = len(close)
+    alpha = 2.0 / (ema_period + 1.0)
+    n_lines = len(windows)
+    # Monotonic deques of (index, value) for each midline window, then the Fisher window
+    n_queues = n_lines + (1 if fisher_period > 0 else 0)
+    lengths = np.empty(n_queues, np.int64)
+    lengths[:n_lines] = windows
+    if fisher_period > 0:
+        lengths[n_lines] = fisher_period
+    capacity = 1
+    for k in range(n_queues):
+        capacity = max(capacity, lengths[k] + 1)
+    max_index = np.empty((n_queues, capacity), np.int64)
+    max_value = np.empty((n_queues, capacity))
+    min_index = np.empty((n_queues, capacity), np.int64)
+    min_value = np.empty((n_queues, capacity))
+    max_head = np.zeros(n_queues, np.int64)
+    max_size = np.zeros(n_queues, np.int64)
+    min_head = np.zeros(n_queues, np.int64)
+    min_size = np.zeros(n_queues, np.int64)
+    highest = np.empty(n_queues)
+    lowest = np.empty(n_queues)
+
+    ring = np.empty(max(atr_period, 1))
+    total = 0.0
+    compensation = 0.0
+    average = 0.0
+    previous_close = 0.0
+    fisher_total = 0.0
+    for i in range(n):
+        h = high[i]
+        l = low[i]
+        c = close[i]
+        if h != h or l != l or c != c:
+            return False
+
+        if ema_period > 0:
+            average = c if i == 0 else (1.0 - alpha) * average + alpha * c
+            ema_out[i] = average
+
+        if atr_period > 0:
+            tr = h - l
+            if not range_only and i > 0:
+                tr = max(tr, abs(h - previous_close), abs(l - previous_close))
+            previous_close = c
+            if len(true_range_out):
+                true_range_out[i] = tr
+            # Kahan-compensated running sum over the last atr_period true ranges
+            slot = i % atr_period
+            if i >= atr_period:
+                y = -ring[slot] - compensation
+                t = total + y
+                compensation = (t - total) - y
+                total = t
+            ring[slot] = tr
+            y = tr - compensation
+            t = total + y
+            compensation = (t - total) - y
+            total = t
+            if len(atr_out):
+                atr_out[i] = total / atr_period if i >= atr_period - 1 else np.nan
+
+        for k in range(n_queues):
+            window = lengths[k]
+            # Drop values that are no larger (smaller) than the new one, then expired ones
+            while max_size[k] > 0 and max_value[k, (max_head[k] + max_size[k] - 1) % capacity] <= h:
+                max_size[k] -= 1
+            slot = (max_head[k] + max_size[k]) % capacity
+            max_index[k, slot] = i
+            max_value[k, slot] = h
+            max_size[k] += 1
+            if max_index[k, max_head[k]] <= i - window:
+                max_head[k] = (max_head[k] + 1) % capacity
+                max_size[k] -= 1
+            while min_size[k] > 0 and min_value[k, (min_head[k] + min_size[k] - 1) % capacity] >= l:
+                min_size[k] -= 1
+            slot = (min_head[k] + min_size[k]) % capacity
+            min_index[k, slot] = i
+            min_value[k, slot] = l
+            min_size[k] += 1
+            if min_index[k, min_head[k]] <= i - window:
+                min_head[k] = (min_head[k] + 1) % capacity
+                min_size[k] -= 1
+            highest[k] = max_value[k, max_head[k]]
+            lowest[k] = min_value[k, min_head[k]]
+
+        for k in range(n_lines):
+            midline_out[k, i] = (highest[k] + lowest[k]) / 2 if i >= windows[k] - 1 else np.nan
+
+        if fisher_period > 0:
+            if i < fisher_period - 1:
+                fisher_out[i] = np.nan
+            else:
+                # Same expression as fisher_transform; NaN steps are skipped like pandas cumsum
+                value = 0.33 * 2 * ((c - lowest[n_lines]) / (highest[n_lines] - lowest[n_lines]) - 0.5)
+                step = np.log((1 + value) / (1 - value))
+                if step != step:
+                    fisher_out[i] = np.nan
+                else:
+                    fisher_total += step
+                    fisher_out[i] = fisher_total
+    return True
+
+
+def indicator_pass(high, low, close, ema_period=0, atr_period=0, midline_periods=(), fisher_period=0,
+                   range_atr=False, true_range=False, out=None):
+    """EMA, true range/ATR, Donchian midlines and the Fisher transform in one pass.
+
+    Each OHLC column is read once and every requested indicator is written
+    straight into its output array, so peak memory is the inputs plus the
+    outputs. Pass preallocated arrays in `out` (same keys as the result, with
+    'midline' as one periods x bars array) to reuse them. Returns a dict with 'ema', 'true_range', 'atr', 'fisher' and
+    'midline' ({period: array}) for whatever was requested. range_atr=True
+    averages High - Low instead of the true range, as range_atr() does.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    ema_period, atr_period, fisher_period = int(ema_period), int(atr_period), int(fisher_period)
+    periods = np.array(midline_periods, dtype=np.int64)
+    if min(ema_period, atr_period, fisher_period) < 0 or np.any(periods < 1):
+        raise ValueError("indicator periods must be at least 1")
+    out = dict(out or {})
+    wanted = {'ema': ema_period > 0, 'true_range': true_range and atr_period > 0,
+              'atr': atr_period > 0, 'fisher': fisher_period > 0}
+    for key, requested in wanted.items():
+        if requested and key not in out:
+            out[key] = np.empty(n)
+    lines = out.get('midline')
+    if lines is None:
+        lines = np.empty((len(periods), n)) if len(periods) else _NO_LINES
+
+    if not HAVE_NUMBA or not _fused_pass(high, low, close, ema_period, atr_period, range_atr, periods,
+                                         fisher_period, out.get('ema', _NO_VALUES),
+                                         out.get('true_range', _NO_VALUES), out.get('atr', _NO_VALUES),
+                                         lines, out.get('fisher', _NO_VALUES)):
+        # Plain pandas fallback, which also keeps pandas' NaN handling
+        if ema_period > 0:
+            out['ema'][:] = _series(close).ewm(span=ema_period, adjust=False).mean().to_numpy()
+        if atr_period > 0:
+            ranges = high - low if range_atr else _true_range(high, low, close)
+            if true_range:
+                out['true_range'][:] = ranges
+            out['atr'][:] = pd.Series(ranges).rolling(window=atr_period).mean().to_numpy()
+        for k, period in enumerate(periods):
+            lines[k] = (_series(high).rolling(window=period).max().to_numpy()
+                        + _series(low).rolling(window=period).min().to_numpy()) / 2
+        if fisher_period > 0:
+            out['fisher'][:] = _fisher_transform(high, low, close, fisher_period)
+
+    result = {key: out[key] for key, requested in wanted.items() if requested}
+    if len(periods):
+        result['midline'] = {int(period): lines[k] for k, period in enumerate(periods)}
+    return result
+
+
+def ema(close, period):
+    # Same seeding as pandas ewm(span=period, adjust=False)
+    return indicator_pass(close, close, close, ema_period=period)['ema']
+
+
+def _true_range(high, low, close):
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    previous_close = np.empty_like(high)
+    previous_close[0] = np.nan
+    previous_close[1:] = np.asarray(close, dtype=np.float64)[:-1]
+    # fmax skips the missing previous close on the first bar
+    return np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+
+
+def true_range(high, low, close):
+    return _true_range(high, low, close)
+
+
+def atr(high, low, close, period):
+    # Simple moving average of the true range
+    return indicator_pass(high, low, close, atr_period=period)['atr']
+
+
+def range_atr(high, low, period):
+    # Moving average of the bar range only (High - Low), as in ema_slope_finder
+    return indicator_pass(high, low, low, atr_period=period, range_atr=True)['atr']
+
+
+def _shift(values, closed):
+    # closed='left' covers the `period` bars before the current one
+    if closed == 'right':
+        return values
+    if closed == 'left':
+        out = np.empty_like(values)
+        out[0] = np.nan
+        out[1:] = values[:-1]
+        return out
+    raise ValueError("closed must be 'right' or 'left'")
+
+
+def highest(values, period, closed='right'):
+    return _shift(_series(values).rolling(window=period).max().to_numpy(), closed)
+
+
+def lowest(values, period, closed='right'):
+    return _shift(_series(values).rolling(window=period).min().to_numpy(), closed)
+
+
+def donchian_midline(high, low, period):
+    return indicator_pass(high, low, low, midline_periods=(period,))['midline'][period]
+
+
+def fisher_transform(high, low, close, period):
+    # Cumulative Fisher transform as used by fisher_test
+    return indicator_pass(high, low, close, fisher_period=period)['fisher']
+
+
+def _fisher_transform(high, low, close, period):
+    highest = _series(high).rolling(window=period).max().to_numpy()
+    lowest = _series(low).rolling(window=period).min().to_numpy()
+    close = np.asarray(close, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = 0.33 * 2 * ((close - lowest) / (highest - lowest) - 0.5)
+        fisher = np.log((1 + value) / (1 - value))
+    return pd.Series(fisher).cumsum().to_numpy()
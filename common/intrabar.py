@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+from common.bar_store import ingest_bars
+from common.kernel import EXIT_STOP_LOSS, EXIT_TAKE_PROFIT
+
+
+def bar_times(frame):
+    """Bar open times (int64 ns, UTC) from a 'Datetime' column or the frame's index."""
+    times = frame['Datetime'] if 'Datetime' in frame.columns else frame.index
+    return pd.DatetimeIndex(times).as_unit('ns').asi8
+
+
+class IntrabarResolver:
+    """Decides SL vs TP on bars that touched both, from lower-timeframe bars.
+
+    The backtest kernel keeps assuming SL first and flags those trades;
+    resolve() then looks up only the lower bars inside each flagged exit bar.
+    They stay memory-mapped in a BarStore and are not opened at all until a
+    flagged trade needs them, so the cost is a binary search and a few rows
+    per ambiguous bar instead of a pass over the lower timeframe. Fills stay
+    at the SL/TP level.
+    """
+
+    def __init__(self, store, symbol):
+        self.store = store
+        self.symbol = symbol
+        self.resolved = 0
+        self.unresolved = 0
+        self.rows_read = 0
+        self._arrays = None
+
+    @classmethod
+    def from_csv(cls, csv_path, store=None):
+        # Lower-timeframe CSV ingested into the bar store next to it (only when it changed)
+        return cls(*ingest_bars(csv_path, store))
+
+    def __repr__(self):
+        # Stable across runs (and changes with the lower bars), so result cache keys can include it
+        rows = self.store.meta(self.symbol)['rows'] if self.store.has(self.symbol) else 0
+        return f'IntrabarResolver({self.store.root!r}, {self.symbol!r}, rows={rows})'
+
+    def __getstate__(self):
+        # Workers reopen the memory map instead of receiving its contents
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    def arrays(self):
+        if self._arrays is None:
+            if not self.store.has(self.symbol):
+                # Nothing to drill into: every flagged trade keeps the SL-first assumption
+                self._arrays = (np.empty(0, dtype=np.int64), np.empty(0), np.empty(0))
+            else:
+                columns, index, values = self.store.load_arrays(self.symbol)
+                self._arrays = (index, values[:, columns.index('High')], values[:, columns.index('Low')])
+        return self._arrays
+
+    def first_touch(self, start, stop, side, stop_level, target_level):
+        """EXIT_STOP_LOSS or EXIT_TAKE_PROFIT, whichever level the lower bars
+        opening in [start, stop) reach first; 0 when they cannot tell (no bars,
+        or one lower bar touching both too)."""
+        index, high, low = self.arrays()
+        first, last = np.searchsorted(index, [start, stop])
+        high, low = np.asarray(high[first:last]), np.asarray(low[first:last])
+        self.rows_read += last - first
+        if side == 1:
+            hit_stop, hit_target = low <= stop_level, high >= target_level
+        else:
+            hit_stop, hit_target = high >= stop_level, low <= target_level
+        stop_at = np.argmax(hit_stop) if hit_stop.any() else len(hit_stop)
+        target_at = np.argmax(hit_target) if hit_target.any() else len(hit_target)
+        if target_at < stop_at:
+            return EXIT_TAKE_PROFIT
+        if stop_at < target_at:
+            return EXIT_STOP_LOSS
+        return 0
+
+    def resolve(self, trades, index, sl, tp, stops, returns=None):
+        """Fix the flagged trades in place (exit price, reason and bar return)."""
+        flagged = np.flatnonzero(trades['ambiguous'])
+        if not len(flagged):
+            return trades
+        times = pd.DatetimeIndex(index).as_unit('ns').asi8
+        for k in flagged:
+            exit_index = int(trades['exit_index'][k])
+            side = int(trades['side'][k])
+            # The levels the kernel compared against on the exit bar
+            level_bar = int(trades['entry_index'][k]) if stops == 'entry' else exit_index - 1
+            start = times[exit_index]
+            if exit_index + 1 < len(times):
+                stop = times[exit_index + 1]
+            else:
+                stop = start + (start - times[exit_index - 1])
+            outcome = self.first_touch(start, stop, side, sl[level_bar], tp[level_bar])
+            if outcome == 0:
+                self.unresolved += 1
+                continue
+            self.resolved += 1
+            trades['ambiguous'][k] = False
+            if outcome == EXIT_TAKE_PROFIT:
+                entry_price = trades['entry_price'][k]
+                trades['exit_price'][k] = tp[level_bar]
+                trades['reason'][k] = EXIT_TAKE_PROFIT
+                if returns is not None:
+                    returns[exit_index] = side * (tp[level_bar] - entry_price) / entry_price
+        return trades
+
+    def stats(self):
+        return {'resolved': self.resolved, 'unresolved': self.unresolved, 'rows_read': self.rows_read}
@@ -0,0 +1,214 @@
+from collections import namedtuple
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # Fall back to plain Python when numba is not installed
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# Where SL/TP levels come from
+STOPS_PREVIOUS_BAR = 0  # Read from the previous bar's SL/TP (Ichimoku loops)
+STOPS_FROM_ENTRY = 1  # Fixed at the entry bar's SL/TP (EMA and fractal loops)
+
+# What an opposite signal does to an open position
+OPPOSITE_IGNORE = 0
+OPPOSITE_CLOSE = 1
+OPPOSITE_REVERSE = 2
+
+# Exit reasons recorded in the trade list
+EXIT_STOP_LOSS = 1
+EXIT_TAKE_PROFIT = 2
+EXIT_SIGNAL = 3
+
+TRADE_DTYPE = np.dtype([
+    ('entry_index', np.int64),
+    ('exit_index', np.int64),
+    ('side', np.int8),
+    ('entry_price', np.float64),
+    ('exit_price', np.float64),
+    ('reason', np.int8),
+    ('ambiguous', np.bool_),  # The exit bar touched both SL and TP; SL was assumed
+])
+
+BacktestResult = namedtuple('BacktestResult', ['returns', 'trades'])
+
+_NO_RETURNS = np.empty(0)
+
+_STOPS = {'previous_bar': STOPS_PREVIOUS_BAR, 'entry': STOPS_FROM_ENTRY}
+_OPPOSITE = {'ignore': OPPOSITE_IGNORE, 'close': OPPOSITE_CLOSE, 'reverse': OPPOSITE_REVERSE}
+
+
+@njit(cache=True)
+def _record(trades, n_trades, entry_index, exit_index, side, entry_price, exit_price, reason, returns,
+            ambiguous=False):
+    trades[n_trades, 0] = entry_index
+    trades[n_trades, 1] = exit_index
+    trades[n_trades, 2] = side
+    trades[n_trades, 3] = entry_price
+    trades[n_trades, 4] = exit_price
+    trades[n_trades, 5] = reason
+    trades[n_trades, 6] = ambiguous
+    if len(returns):
+        returns[exit_index] = side * (exit_price - entry_price) / entry_price
+    return n_trades + 1
+
+
+@njit(cache=True)
+def _run(close, high, low, signal, sl, tp, stops, opposite, allow_short, check_entry_bar,
+         refresh_on_repeat, signal_first, start, stop, state, returns, trades):
+    # state holds [position, entry_price, entry_index, stop_level, target_level]
+    # so a run can be resumed where the previous chunk stopped. Returns the number of
+    # trades recorded and the bar to resume from when the trade buffer filled up first
+    position = int(state[0])
+    entry_price = state[1]
+    entry_index = int(state[2])
+    stop_level = state[3]
+    target_level = state[4]
+    n_trades = 0
+    resume = stop
+
+    for i in range(start, stop):
+        # A bar closes at most one trade, so stop while there is no room for another
+        if n_trades == len(trades):
+            resume = i
+            break
+        s = signal[i]
+        if position == 0:
+            if s == 1 or (s == -1 and allow_short):
+                position = s
+                entry_price = close[i]
+                entry_index = i
+                stop_level = sl[i]
+                target_level = tp[i]
+                if not check_entry_bar:
+                    continue
+            else:
+                continue
+        elif refresh_on_repeat and s == position:
+            entry_price = close[i]
+            entry_index = i
+            stop_level = sl[i]
+            target_level = tp[i]
+        elif signal_first and s == -position and opposite != OPPOSITE_IGNORE:
+            n_trades = _record(trades, n_trades, entry_index, i, position, entry_price,
+                               close[i], EXIT_SIGNAL, returns)
+            position = 0
+            if opposite == OPPOSITE_REVERSE and (s == 1 or allow_short):
+                position = s
+                entry_price = close[i]
+                entry_index = i
+                stop_level = sl[i]
+                target_level = tp[i]
+            continue
+
+        if stops == STOPS_PREVIOUS_BAR:
+            if i == 0:
+                # No previous bar whose levels could have been hit yet
+                continue
+            stop_level = sl[i - 1]
+            target_level = tp[i - 1]
+
+        # Stop loss is assumed to be hit before take profit when a bar touches both;
+        # such trades are flagged so the order can be checked on lower-timeframe bars
+        if position == 1:
+            hit_stop = low[i] <= stop_level
+            hit_target = high[i] >= target_level
+        else:
+            hit_stop = high[i] >= stop_level
+            hit_target = low[i] <= target_level
+        if hit_stop:
+            n_trades = _record(trades, n_trades, entry_index, i, position, entry_price,
+                               stop_level, EXIT_STOP_LOSS, returns, hit_target)
+            position = 0
+        elif hit_target:
+            n_trades = _record(trades, n_trades, entry_index, i, position, entry_price,
+                               target_level, EXIT_TAKE_PROFIT, returns)
+            position = 0
+        elif not signal_first and s == -position and opposite != OPPOSITE_IGNORE:
+            n_trades = _record(trades, n_trades, entry_index, i, position, entry_price,
+                               close[i], EXIT_SIGNAL, returns)
+            position = 0
+            if opposite == OPPOSITE_REVERSE and (s == 1 or allow_short):
+                position = s
+                entry_price = close[i]
+                entry_index = i
+                stop_level = sl[i]
+                target_level = tp[i]
+
+    state[0] = position
+    state[1] = entry_price
+    state[2] = entry_index
+    state[3] = stop_level
+    state[4] = target_level
+    return n_trades, resume
+
+
+def _as_float(values):
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def new_state():
+    return np.array([0.0, 0.0, -1.0, np.nan, np.nan])
+
+
+def open_trade(state):
+    # The position left open in `state` as a one-row trade list (exit_index -1), or no rows
+    trade = np.zeros(1 if state[0] != 0 else 0, dtype=TRADE_DTYPE)
+    if len(trade):
+        trade[0] = (int(state[2]), -1, int(state[0]), state[1], np.nan, 0, False)
+    return trade
+
+
+def run_backtest(close, high, low, signal, sl, tp, stops='previous_bar', on_opposite='reverse',
+                 allow_short=True, check_entry_bar=False, refresh_on_repeat=False,
+                 signal_first=False, start=0, stop=None, state=None, returns=None, record_returns=True,
+                 index=None, intrabar=None):
+    """Run the long/short/flat position state machine over whole arrays.
+
+    Returns per-bar returns (NaN on bars without an exit) and the closed trades
+    as a TRADE_DTYPE array. Pass `state` (and `returns`) to continue a run over
+    the next `start:stop` chunk. With record_returns=False no per-bar array is
+    allocated and `returns` is None, so memory grows with the number of trades
+    only. The input arrays are never written to. With an `intrabar` resolver
+    (see common/intrabar.py) and the bar times in `index`, trades whose exit bar
+    touched both SL and TP are re-decided from lower-timeframe bars.
+    """
+    close = _as_float(close)
+    high, low, sl, tp = _as_float(high), _as_float(low), _as_float(sl), _as_float(tp)
+    signal = np.ascontiguousarray(signal, dtype=np.int64)
+    n = len(close)
+    stop = n if stop is None else stop
+    if state is None:
+        state = new_state()
+    if returns is None and record_returns:
+        returns = np.full(n, np.nan)
+    bar_returns = returns if returns is not None else _NO_RETURNS
+
+    # Trades go into a buffer that doubles whenever the kernel fills it
+    capacity = 1024
+    parts = []
+    position = start
+    while True:
+        raw = np.empty((capacity, 7))
+        n_trades, position = _run(close, high, low, signal, sl, tp,
+                                  _STOPS[stops], _OPPOSITE[on_opposite], allow_short, check_entry_bar,
+                                  refresh_on_repeat, signal_first, position, stop, state, bar_returns, raw)
+        parts.append(raw[:n_trades])
+        if position >= stop:
+            break
+        capacity *= 2
+    raw = np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    trades = np.empty(len(raw), dtype=TRADE_DTYPE)
+    for column, name in enumerate(TRADE_DTYPE.names):
+        trades[name] = raw[:, column]
+    if intrabar is not None:
+        intrabar.resolve(trades, index, sl, tp, stops, returns)
+    return BacktestResult(returns, trades)
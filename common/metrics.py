@@ -0,0 +1,169 @@
+import numpy as np
+
+TRADING_DAYS = 252
+
+
+def _unwrap(metrics):
+    # 0-d results (a single series or ledger) come back as plain Python numbers
+    return {key: np.asarray(value).item() if np.ndim(value) == 0 else value for key, value in metrics.items()}
+
+
+def drawdowns(equity, initial=None, relative=False):
+    """Maximum drawdown and its duration in steps, along the last axis.
+
+    The drawdown is equity minus its running peak (equity / peak - 1 when
+    `relative`), so it is zero or negative. The duration is the longest
+    stretch spent below a previous peak. `initial` is the equity before the
+    first step, so a curve that starts by losing is in drawdown at once.
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    if initial is not None:
+        start = np.full(equity.shape[:-1] + (1,), float(initial))
+        equity = np.concatenate([start, equity], axis=-1)
+    peak = np.maximum.accumulate(equity, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        depth = equity / peak - 1 if relative else equity - peak
+    steps = np.arange(equity.shape[-1])
+    last_peak = np.maximum.accumulate(np.where(equity >= peak, steps, 0), axis=-1)
+    return depth.min(axis=-1), (steps - last_peak).max(axis=-1)
+
+
+def return_metrics(returns, periods_per_year=TRADING_DAYS, compound=False, positions=None):
+    """Performance of per-bar (or per-trade) returns; NaN counts as no return.
+
+    Works along the last axis, so a (parameter sets x bars) matrix is scored
+    row by row in one call. Returns are summed into the equity curve, as the
+    backtests here report them, or compounded with compound=True. Exposure
+    needs the matching `positions` (non-zero while in the market).
+    """
+    returns = np.nan_to_num(np.asarray(returns, dtype=np.float64))
+    n = returns.shape[-1]
+    equity = np.cumprod(1 + returns, axis=-1) if compound else 1 + np.cumsum(returns, axis=-1)
+    final = equity[..., -1] if n else np.ones(returns.shape[:-1])
+    years = n / periods_per_year
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if not n:
+            annualized = np.full(np.shape(final), np.nan)
+        elif compound:
+            annualized = np.where(final > 0, final ** (1 / years) - 1, -1.0)
+        else:
+            annualized = (final - 1) / years
+        mean = returns.mean(axis=-1)
+        std = returns.std(axis=-1, ddof=1)
+        downside = np.sqrt(np.mean(np.minimum(returns, 0) ** 2, axis=-1))
+        sharpe = np.where(std > 0, mean / std, np.nan) * np.sqrt(periods_per_year)
+        sortino = np.where(downside > 0, mean / downside, np.nan) * np.sqrt(periods_per_year)
+    max_drawdown, duration = drawdowns(equity, initial=1.0, relative=compound)
+    metrics = {
+        'total_return': final - 1,
+        'annualized_return': annualized,
+        'sharpe': sharpe,
+        'sortino': sortino,
+        'max_drawdown': max_drawdown,
+        'drawdown_duration': duration,
+    }
+    if positions is not None:
+        metrics['exposure'] = (np.asarray(positions) != 0).mean(axis=-1)
+    return _unwrap(metrics)
+
+
+def trade_returns(trades):
+    return trades['side'] * (trades['exit_price'] - trades['entry_price']) / trades['entry_price']
+
+
+def trade_metrics(trades, pnl=None, n_bars=None, groups=None, n_groups=None):
+    """Performance of the closed trades in a TRADE_DTYPE ledger.
+
+    `pnl` is one value per trade and defaults to trade_returns(trades). With
+    `groups` (an integer per trade, e.g. the parameter set that produced it;
+    trades in time order within a group) every metric is an array over the
+    groups, computed for all of them at once. Exposure is the share of
+    `n_bars` spent in a trade; the drawdown duration is counted in trades.
+    """
+    closed = trades['exit_index'] >= 0
+    pnl = trade_returns(trades) if pnl is None else np.asarray(pnl, dtype=np.float64)
+    trades, pnl = trades[closed], pnl[closed]
+    if groups is None:
+        group = np.zeros(len(trades), dtype=np.int64)
+        n_groups = 1
+    else:
+        group = np.asarray(groups, dtype=np.int64)[closed]
+        if n_groups is None:
+            n_groups = int(group.max()) + 1 if len(group) else 0
+
+    def per_group(weights):
+        return np.bincount(group, weights=weights, minlength=n_groups).astype(np.float64)
+
+    count = np.bincount(group, minlength=n_groups)
+    wins = np.bincount(group[pnl > 0], minlength=n_groups)
+    losses = np.bincount(group[pnl < 0], minlength=n_groups)
+    gross_profit = per_group(np.where(pnl > 0, pnl, 0.0))
+    gross_loss = -per_group(np.where(pnl < 0, pnl, 0.0))
+    total = per_group(pnl)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_rate = np.where(count > 0, wins / count, 0.0)
+        expectancy = np.where(count > 0, total / count, 0.0)
+        profit_factor = np.where(gross_loss > 0, gross_profit / gross_loss,
+                                 np.where(gross_profit > 0, np.inf, np.nan))
+
+    # Cumulative PnL per group, one row each padded to the longest group. The padding
+    # sits at the group's peak, so it adds no drawdown depth or duration.
+    order = np.argsort(group, kind='stable')
+    starts = np.cumsum(count) - count
+    width = int(count.max()) if len(count) else 0
+    rows = np.zeros((n_groups, width))
+    rows[group[order], np.arange(len(order)) - starts[group[order]]] = pnl[order]
+    equity = np.cumsum(rows, axis=1)
+    peak = np.maximum.accumulate(np.maximum(equity, 0.0), axis=1)
+    equity = np.where(np.arange(width) >= count[:, None], peak, equity)
+    max_drawdown, duration = drawdowns(equity, initial=0.0)
+
+    metrics = {
+        'trades': count,
+        'wins': wins,
+        'losses': losses,
+        'win_rate': win_rate,
+        'total': total,
+        'expectancy': expectancy,
+        'profit_factor': profit_factor,
+        'max_drawdown': max_drawdown,
+        'drawdown_duration': duration,
+    }
+    if n_bars:
+        metrics['exposure'] = per_group(trades['exit_index'] - trades['entry_index']) / n_bars
+    if groups is None:
+        metrics = {key: value[0] for key, value in metrics.items()}
+    return _unwrap(metrics)
+
+
+def check_groups(n_groups=20, seed=0):
+    """Score random ledgers of different lengths grouped in one call and one by one.
+
+    Every grouped metric must equal the one from the group's own trades.
+    """
+    from common.kernel import TRADE_DTYPE
+
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(0, 30, n_groups)
+    counts[:2] = (2, 10)
+    group = np.repeat(np.arange(n_groups), counts)
+    trades = np.zeros(len(group), dtype=TRADE_DTYPE)
+    trades['side'] = rng.choice([-1, 1], len(group))
+    trades['entry_price'] = 100.0
+    trades['exit_price'] = 100 + rng.normal(0, 1, len(group))
+    trades['exit_index'] = np.arange(len(group))
+    # A short group ending underwater next to a longer one
+    trades['side'][:2] = 1
+    trades['exit_price'][:2] = (101.0, 99.0)
+    grouped = trade_metrics(trades, n_bars=len(group), groups=group, n_groups=n_groups)
+    for g in range(n_groups):
+        alone = trade_metrics(trades[group == g], n_bars=len(group))
+        for key, value in alone.items():
+            if not np.allclose(grouped[key][g], value, equal_nan=True):
+                raise AssertionError(f"grouped {key} for group {g} is {grouped[key][g]}, alone {value}")
+    return True
+
+
+if __name__ == "__main__":
+    check_groups()
+    print("Grouped trade metrics match the per-group ones.")
@@ -0,0 +1,168 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from common.kernel import HAVE_NUMBA, njit
+
+try:
+    from numba import prange
+except ImportError:
+    prange = range
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 ** 2
+
+
+@njit(cache=True, parallel=True)
+def _simulate_compiled(returns, seeds, block, block_size, checkpoints, bust, goal,
+                       finals, max_drawdowns, busts, goals, samples):
+    # One path per simulation, reduced on the fly so only one path per thread is held
+    n = len(returns)
+    for k in prange(len(seeds)):
+        np.random.seed(seeds[k])  # Per-simulation seed keeps results independent of threading
+        path = returns.copy()
+        if block:
+            offset = 0
+            while offset < n:
+                start = np.random.randint(0, n)
+                for j in range(min(block_size, n - offset)):
+                    path[offset + j] = returns[(start + j) % n]
+                offset += block_size
+        else:
+            for i in range(n - 1, 0, -1):
+                j = np.random.randint(0, i + 1)
+                path[i], path[j] = path[j], path[i]
+
+        total = 0.0
+        peak = 0.0
+        drawdown = 0.0
+        lowest = np.inf
+        highest = -np.inf
+        c = 0
+        for i in range(n):
+            total += path[i]
+            lowest = min(lowest, total)
+            highest = max(highest, total)
+            peak = max(peak, total)
+            drawdown = max(drawdown, peak - total)
+            if c < len(checkpoints) and checkpoints[c] == i:
+                samples[k, c] = total
+                c += 1
+        finals[k] = total
+        max_drawdowns[k] = -drawdown
+        busts[k] = lowest <= bust
+        goals[k] = highest >= goal
+
+
+def _simulate_chunk(returns, sims, seed, method, block_size, checkpoints, bust, goal):
+    if method not in ('shuffle', 'block'):
+        raise ValueError("method must be 'shuffle' or 'block'")
+    if HAVE_NUMBA:
+        seeds = np.random.default_rng(seed).integers(0, 2 ** 31 - 1, size=sims)
+        finals, max_drawdowns = np.empty(sims), np.empty(sims)
+        busts, goals = np.empty(sims, dtype=np.bool_), np.empty(sims, dtype=np.bool_)
+        samples = np.empty((sims, len(checkpoints)))
+        _simulate_compiled(returns, seeds, method == 'block', block_size, checkpoints, bust, goal,
+                           finals, max_drawdowns, busts, goals, samples)
+        return finals, max_drawdowns, busts, goals, samples
+    return _simulate_chunk_numpy(returns, sims, seed, method, block_size, checkpoints, bust, goal)
+
+
+def _simulate_chunk_numpy(returns, sims, seed, method, block_size, checkpoints, bust, goal):
+    # Bootstrap `sims` return paths as one matrix and reduce them to per-simulation statistics
+    rng = np.random.default_rng(seed)
+    n = len(returns)
+    if method == 'shuffle':
+        paths = rng.permuted(np.broadcast_to(returns, (sims, n)), axis=1)
+    elif method == 'block':
+        # Circular block bootstrap: concatenate random runs of `block_size` consecutive returns
+        n_blocks = -(-n // block_size)
+        starts = rng.integers(0, n, size=(sims, n_blocks, 1))
+        index = (starts + np.arange(block_size)) % n
+        paths = returns[index.reshape(sims, -1)[:, :n]]
+        del index
+
+    np.cumsum(paths, axis=1, out=paths)
+    busts = paths.min(axis=1) <= bust
+    goals = paths.max(axis=1) >= goal
+    samples = paths[:, checkpoints]
+
+    # Drawdown from the running peak, counting the starting equity of 0 as a peak
+    peak = np.maximum.accumulate(paths, axis=1)
+    np.maximum(peak, 0.0, out=peak)
+    peak -= paths
+    max_drawdowns = -peak.max(axis=1)
+    return paths[:, -1].copy(), max_drawdowns, busts, goals, samples
+
+
+def montecarlo(returns, sims=1000, bust=-0.1, goal=0.5, method='shuffle', block_size=10, seed=None,
+               memory_budget=DEFAULT_MEMORY_BUDGET, processes=None, band_points=100,
+               percentiles=(5, 25, 50, 75, 95)):
+    """Bootstrap Monte Carlo over a series of trade returns.
+
+    Paths are the cumulative sum of resampled returns, generated in chunks of
+    simulations that fit `memory_budget`. Each chunk gets its own child seed, so
+    results depend only on `seed` (and whether numba is installed), not on
+    `processes`.
+    """
+    returns = pd.Series(returns).dropna().to_numpy(dtype=np.float64)
+    n = len(returns)
+    if n == 0:
+        raise ValueError("no returns to simulate")
+    checkpoints = np.unique(np.linspace(0, n - 1, min(band_points, n)).astype(np.int64))
+    # Sized for the numpy path, where paths, running peaks and indices are alive together
+    chunk_sims = int(max(1, min(sims, memory_budget // (3 * n * 8))))
+    sizes = [min(chunk_sims, sims - start) for start in range(0, sims, chunk_sims)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(returns, size, child, method, block_size, checkpoints, bust, goal) for size, child in zip(sizes, seeds)]
+
+    if processes and processes > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            chunks = list(pool.map(_simulate_chunk, *zip(*tasks)))
+    else:
+        chunks = [_simulate_chunk(*task) for task in tasks]
+
+    finals, max_drawdowns, busts, goals, samples = (np.concatenate(parts) for parts in zip(*chunks))
+    return MonteCarloResult(finals, max_drawdowns, busts, goals, checkpoints, samples, percentiles)
+
+
+class MonteCarloResult:
+    def __init__(self, finals, max_drawdowns, busts, goals, checkpoints, samples, percentiles):
+        self.finals = finals
+        self.max_drawdowns = max_drawdowns
+        self.checkpoints = checkpoints
+        self.bands = pd.DataFrame(np.percentile(samples, percentiles, axis=0).T, index=checkpoints + 1,
+                                  columns=[f'p{p:g}' for p in percentiles])
+        self.bands.index.name = 'Trade'
+        self.stats = {
+            'min': finals.min(),
+            'max': finals.max(),
+            'mean': finals.mean(),
+            'median': np.median(finals),
+            'std': finals.std(),
+            'maxdd': max_drawdowns.min(),
+            'bust': busts.mean(),
+            'goal': goals.mean(),
+        }
+
+    def drawdown_percentiles(self, percentiles=(5, 25, 50, 75, 95)):
+        return pd.Series(np.percentile(self.max_drawdowns, percentiles), index=[f'p{p:g}' for p in percentiles])
+
+    def plot(self, title=None):
+        import matplotlib.pyplot as plt
+
+        ax = plt.gca()
+        columns = list(self.bands.columns)
+        for k in range(len(columns) // 2):
+            ax.fill_between(self.bands.index, self.bands[columns[k]], self.bands[columns[-k - 1]],
+                            alpha=0.15 + 0.15 * k, color='tab:blue', linewidth=0,
+                            label=f'{columns[k]}-{columns[-k - 1]}')
+        if len(columns) % 2:
+            middle = columns[len(columns) // 2]
+            ax.plot(self.bands.index, self.bands[middle], color='tab:blue', label=middle)
+        ax.set_xlabel('Trade')
+        ax.set_ylabel('Cumulative return')
+        if title:
+            ax.set_title(title)
+        ax.legend()
+        return ax
@@ -0,0 +1,184 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from common import indicators
+from common.kernel import njit
+from common.metrics import TRADING_DAYS, return_metrics
+
+try:
+    from numba import prange
+except ImportError:
+    prange = range
+
+DEFAULT_MEMORY_BUDGET = 512 * 1024 ** 2
+
+
+def ema_matrix(close, periods):
+    """(len(periods), T) matrix of EMAs, one row per period."""
+    close = np.asarray(close, dtype=np.float64)
+    out = np.empty((len(periods), len(close)))
+    for k, period in enumerate(periods):
+        out[k] = indicators.ema(close, period)
+    return out
+
+
+def _chunks_by_periods(keys, max_periods):
+    # Split sorted parameter keys so no chunk needs more than max_periods distinct periods
+    chunk, periods = [], set()
+    for key in keys:
+        needed = periods | set(key)
+        if chunk and len(needed) > max_periods:
+            yield chunk
+            chunk, needed = [], set(key)
+        chunk.append(key)
+        periods = needed
+    if chunk:
+        yield chunk
+
+
+@njit(cache=True, parallel=True)
+def _triple_ema_grid(close, previous_close, high, low, emas, short_row, medium_row, long_row,
+                     tp_percent, sl_percent, pnl, win_rate, trade_count):
+    # The ema/3ema.py backtest for every combination, one combination per thread
+    for c in prange(len(short_row)):
+        ema_short = emas[short_row[c]]
+        ema_medium = emas[medium_row[c]]
+        ema_long = emas[long_row[c]]
+        position = 0
+        entry_price = 0.0
+        total = 0.0
+        wins = 0
+        trades = 0
+        for i in range(len(close)):
+            if position == 0:
+                if ema_short[i] > ema_medium[i] and ema_long[i] > previous_close[i]:
+                    position = 1
+                    entry_price = close[i]
+                elif ema_short[i] < ema_medium[i] and ema_long[i] < previous_close[i]:
+                    position = -1
+                    entry_price = close[i]
+            else:
+                stop_loss = entry_price * (1 - position * sl_percent[c])
+                take_profit = entry_price * (1 + position * tp_percent[c])
+                if position == 1:
+                    hit_stop = low[i] <= stop_loss
+                    hit_target = high[i] >= take_profit
+                else:
+                    hit_stop = high[i] >= stop_loss
+                    hit_target = low[i] <= take_profit
+                if hit_stop or hit_target:
+                    exit_price = stop_loss if hit_stop else take_profit
+                    # PnL is Exit - Entry regardless of side, as in 3ema.backtest
+                    total += exit_price - entry_price
+                    wins += exit_price - entry_price > 0
+                    trades += 1
+                    position = 0
+        pnl[c] = total
+        win_rate[c] = wins / trades if trades else 0.0
+        trade_count[c] = trades
+
+
+def triple_ema_grid(data, short_periods, medium_periods, long_periods, tp_percents, sl_percents,
+                    memory_budget=DEFAULT_MEMORY_BUDGET):
+    """Evaluate every (short, medium, long, tp, sl) combination of the 3ema strategy.
+
+    Returns one row per combination with total PnL, win rate and trade count.
+    EMA rows are computed once per period within memory-bounded chunks.
+    """
+    close = data['Close'].to_numpy(dtype=np.float64)
+    high = data['High'].to_numpy(dtype=np.float64)
+    low = data['Low'].to_numpy(dtype=np.float64)
+    previous_close = np.roll(close, 1)  # Bar 0 compares against the last close, as in 3ema.backtest
+    exits = list(itertools.product(tp_percents, sl_percents))
+    keys = sorted(itertools.product(short_periods, medium_periods, long_periods), key=lambda key: key[::-1])
+    max_periods = max(3, memory_budget // max(close.nbytes, 1))
+
+    tables = []
+    for chunk in _chunks_by_periods(keys, max_periods):
+        periods = sorted(set(itertools.chain.from_iterable(chunk)))
+        rows = {period: k for k, period in enumerate(periods)}
+        emas = ema_matrix(close, periods)
+
+        combos = np.array([(s, m, l, tp, sl) for s, m, l in chunk for tp, sl in exits], dtype=np.float64)
+        n = len(combos)
+        pnl, win_rate, trade_count = np.empty(n), np.empty(n), np.empty(n, dtype=np.int64)
+        _triple_ema_grid(close, previous_close, high, low, emas,
+                         np.array([rows[int(p)] for p in combos[:, 0]]),
+                         np.array([rows[int(p)] for p in combos[:, 1]]),
+                         np.array([rows[int(p)] for p in combos[:, 2]]),
+                         combos[:, 3].copy(), combos[:, 4].copy(), pnl, win_rate, trade_count)
+        table = pd.DataFrame(combos, columns=['short_period', 'medium_period', 'long_period', 'tp_percent', 'sl_percent'])
+        table[['short_period', 'medium_period', 'long_period']] = table[['short_period', 'medium_period', 'long_period']].astype(int)
+        table['pnl'] = pnl
+        table['win_rate'] = win_rate
+        table['trades'] = trade_count
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+def fisher_grid(data, fisher_periods, ema_periods, tps, sls, memory_budget=DEFAULT_MEMORY_BUDGET,
+                periods_per_year=TRADING_DAYS):
+    """Evaluate every (fisher_period, ema_period, tp, sl) combination of fisher_test.strategy.
+
+    TP/SL only decide how the cumulative return is reported, so each signal pair
+    needs one pass for its final, highest and lowest cumulative value, which are
+    then broadcast over the whole tp x sl grid. Sharpe, Sortino, drawdown and
+    exposure of each pair's compounded bar returns are scored for the whole
+    chunk at once.
+    """
+    close = data['Close'].to_numpy(dtype=np.float64)
+    high = data['High'].to_numpy(dtype=np.float64)
+    low = data['Low'].to_numpy(dtype=np.float64)
+    price_change = np.empty_like(close)
+    price_change[0] = np.nan
+    price_change[1:] = close[1:] / close[:-1] - 1
+
+    fishers = np.array([indicators.fisher_transform(high, low, close, p) for p in fisher_periods])
+    emas = ema_matrix(close, ema_periods)
+    pairs = list(itertools.product(range(len(fisher_periods)), range(len(ema_periods))))
+    tp_grid, sl_grid = (g.ravel() for g in np.meshgrid(np.asarray(tps, dtype=float), np.asarray(sls, dtype=float), indexing='ij'))
+    # Each pair holds about ten T-length temporaries at once, counting the metrics
+    chunk_size = max(1, memory_budget // max(10 * close.nbytes, 1))
+
+    tables = []
+    for start in range(0, len(pairs), chunk_size):
+        chunk = pairs[start:start + chunk_size]
+        f = fishers[[a for a, _ in chunk]]
+        e = emas[[b for _, b in chunk]]
+        signal = np.where((f > 0) & (close > e), 1.0, np.where((f < 0) & (close < e), -1.0, 0.0))
+        returns = signal[:, :-1] * price_change[1:]
+        cumulative = np.cumprod(1 + returns, axis=1)
+        final = cumulative[:, -1:]
+        highest = cumulative.max(axis=1, keepdims=True)
+        lowest = cumulative.min(axis=1, keepdims=True)
+
+        # fisher_test.strategy: TP/SL value on the last bar if it is beyond either level,
+        # NaN if only earlier bars were, otherwise the final cumulative return
+        hit_tp = final >= tp_grid
+        hit_sl = final <= sl_grid
+        value = np.where(hit_tp & hit_sl, np.minimum(tp_grid, sl_grid),
+                         np.where(hit_tp, tp_grid, np.where(hit_sl, sl_grid, np.nan)))
+        ever_hit = (highest >= tp_grid) | (lowest <= sl_grid)
+        value = np.where(np.isnan(value) & ~ever_hit, final, value)
+
+        entries = ((signal[:, 1:] != 0) & (signal[:, 1:] != signal[:, :-1])).sum(axis=1) + (signal[:, 0] != 0)
+        in_market = signal[:, :-1] != 0
+        bars = in_market.sum(axis=1)
+        win_rate = np.divide((returns > 0).sum(axis=1), bars, out=np.zeros(len(chunk)), where=bars > 0)
+        metrics = return_metrics(returns, periods_per_year, compound=True, positions=in_market)
+
+        k = len(tp_grid)
+        tables.append(pd.DataFrame({
+            'fisher_period': np.repeat([fisher_periods[a] for a, _ in chunk], k),
+            'ema_period': np.repeat([ema_periods[b] for _, b in chunk], k),
+            'tp': np.tile(tp_grid, len(chunk)),
+            'sl': np.tile(sl_grid, len(chunk)),
+            'final': value.ravel(),
+            'pnl': value.ravel() - 1,
+            'win_rate': np.repeat(win_rate, k),
+            'trades': np.repeat(entries, k),
+            **{name: np.repeat(metrics[name], k) for name in ('sharpe', 'sortino', 'max_drawdown', 'exposure')},
+        }))
+    return pd.concat(tables, ignore_index=True)
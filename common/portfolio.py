@@ -0,0 +1,149 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
+from scipy.signal import lfilter
+
+from common.kernel import run_backtest
+
+FIELDS = ('Open', 'High', 'Low', 'Close')
+
+PortfolioResult = namedtuple('PortfolioResult', ['returns', 'equity', 'attribution', 'trades'])
+
+
+class BarPanel:
+    """Bars for many symbols aligned on one time axis: values[symbol, time, field].
+
+    Gaps are forward filled (and leading bars back filled) so the indicators run
+    uninterrupted; `valid` marks the bars a symbol actually traded.
+    """
+
+    def __init__(self, symbols, index, values, valid, fields=FIELDS):
+        self.symbols = list(symbols)
+        self.index = index
+        self.values = values
+        self.valid = valid
+        self.fields = list(fields)
+
+    def field(self, name):
+        return self.values[:, :, self.fields.index(name)]
+
+    @classmethod
+    def align(cls, frames, fields=FIELDS):
+        symbols = list(frames)
+        index = frames[symbols[0]].index
+        for symbol in symbols[1:]:
+            index = index.union(frames[symbol].index)
+        values = np.empty((len(symbols), len(index), len(fields)))
+        valid = np.empty((len(symbols), len(index)), dtype=bool)
+        for s, symbol in enumerate(symbols):
+            frame = frames[symbol].reindex(index)[list(fields)]
+            valid[s] = frame.notna().all(axis=1).to_numpy()
+            values[s] = frame.ffill().bfill().to_numpy(dtype=np.float64)
+        return cls(symbols, index, values, valid, fields)
+
+    @classmethod
+    def from_store(cls, store, symbols, fields=FIELDS):
+        return cls.align({symbol: store.load(symbol) for symbol in symbols}, fields)
+
+
+# Indicators over every symbol at once (axis 0 = symbol, axis 1 = time)
+
+def ema(values, period):
+    # ewm(span=period, adjust=False) along time, seeded with each symbol's first value
+    alpha = 2.0 / (period + 1)
+    initial = (1 - alpha) * values[:, :1]
+    return lfilter([alpha], [1, alpha - 1], values, axis=1, zi=initial)[0]
+
+
+def rolling_max(values, period):
+    out = maximum_filter1d(values, size=period, axis=1, origin=(period - 1) // 2)
+    out[:, :period - 1] = np.nan
+    return out
+
+
+def rolling_min(values, period):
+    out = minimum_filter1d(values, size=period, axis=1, origin=(period - 1) // 2)
+    out[:, :period - 1] = np.nan
+    return out
+
+
+def rolling_mean(values, period):
+    sums = np.cumsum(values, axis=1)
+    out = np.full(values.shape, np.nan)
+    out[:, period - 1] = sums[:, period - 1]
+    out[:, period:] = sums[:, period:] - sums[:, :-period]
+    return out / period
+
+
+def atr(high, low, close, period):
+    previous_close = np.empty_like(close)
+    previous_close[:, 0] = np.nan
+    previous_close[:, 1:] = close[:, :-1]
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    return rolling_mean(true_range, period)
+
+
+def donchian_midline(high, low, period):
+    return (rolling_max(high, period) + rolling_min(low, period)) / 2
+
+
+def _run_symbols(panel, signal, stop_loss, take_profit, weights, **kernel_args):
+    high, low, close = panel.field('High'), panel.field('Low'), panel.field('Close')
+    # No new entries on bars a symbol did not trade
+    signal = np.where(panel.valid, signal, 0)
+
+    returns = np.zeros(close.shape)
+    trades = {}
+    for s, symbol in enumerate(panel.symbols):
+        result = run_backtest(close[s], high[s], low[s], signal[s], stop_loss[s], take_profit[s], **kernel_args)
+        returns[s] = np.nan_to_num(result.returns)
+        trades[symbol] = result.trades
+
+    if weights is None:
+        weights = np.full(len(panel.symbols), 1.0 / len(panel.symbols))
+    contributions = returns * np.asarray(weights, dtype=np.float64)[:, None]
+    equity = pd.Series(1 + np.cumsum(contributions.sum(axis=0)), index=panel.index)
+    attribution = pd.DataFrame({
+        'trades': [len(trades[symbol]) for symbol in panel.symbols],
+        'return': returns.sum(axis=1),
+        'contribution': contributions.sum(axis=1),
+        'win_rate': [float((trades[symbol]['side'] * (trades[symbol]['exit_price'] - trades[symbol]['entry_price']) > 0).mean())
+                     if len(trades[symbol]) else 0.0 for symbol in panel.symbols],
+    }, index=pd.Index(panel.symbols, name='Symbol'))
+    return PortfolioResult(returns, equity, attribution, trades)
+
+
+def ichimoku_portfolio(panel, ema_period=50, conversion_period=9, base_period=26, atr_period=14,
+                       sl_atr_multiplier=2.0, tp_atr_multiplier=1.5, weights=None):
+    """IchimokuCloudStrategy across every symbol in the panel, in one vectorized pass."""
+    high, low, close = panel.field('High'), panel.field('Low'), panel.field('Close')
+    trend = ema(close, ema_period)
+    average_range = atr(high, low, close, atr_period)
+    conversion_line = donchian_midline(high, low, conversion_period)
+    base_line = donchian_midline(high, low, base_period)
+
+    signal = np.where((conversion_line > base_line) & (close > trend), 1,
+                      np.where((conversion_line < base_line) & (close < trend), -1, 0))
+    stop_loss = np.where(signal != 0, close - signal * average_range * sl_atr_multiplier, 0.0)
+    take_profit = np.where(signal != 0, close + signal * average_range * tp_atr_multiplier, 0.0)
+    return _run_symbols(panel, signal, stop_loss, take_profit, weights,
+                        stops='previous_bar', on_opposite='reverse', start=1)
+
+
+def triple_ema_portfolio(panel, short_period=10, medium_period=30, long_period=100,
+                         tp_percent=0.03, sl_percent=0.02, weights=None):
+    """The ema/3ema.py strategy across every symbol in the panel, in one vectorized pass."""
+    close = panel.field('Close')
+    previous_close = np.roll(close, 1, axis=1)
+    ema_short = ema(close, short_period)
+    ema_medium = ema(close, medium_period)
+    ema_long = ema(close, long_period)
+
+    signal = np.where((ema_short > ema_medium) & (ema_long > previous_close), 1,
+                      np.where((ema_short < ema_medium) & (ema_long < previous_close), -1, 0))
+    stop_loss = close * (1 - signal * sl_percent)
+    take_profit = close * (1 + signal * tp_percent)
+    return _run_symbols(panel, signal, stop_loss, take_profit, weights,
+                        stops='entry', on_opposite='ignore')
@@ -0,0 +1,208 @@
+import atexit
+import functools
+import json
+import os
+import time
+from contextlib import nullcontext
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ENV_VAR = 'TESTBOT_PROFILE'
+
+_disabled = nullcontext()
+
+
+def _peak_rss():
+    # High-water resident set size in bytes
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+    return None
+
+
+def _reset_peak_rss():
+    # Linux only; elsewhere the peak stays the process-wide high-water mark
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+class _Stage:
+    def __init__(self, recorder, name, rows, tags):
+        self.recorder = recorder
+        self.name = name
+        self.rows = rows
+        self.tags = tags
+        self.peak_rss = 0
+        self.peak_alloc = 0
+
+    def __enter__(self):
+        self.recorder._reset_peaks()
+        self.recorder._active.append(self)
+        self.started = time.time()
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        self.recorder._observe_peaks()
+        self.recorder._active.pop()
+        record = {'stage': self.name, 'pid': os.getpid(), 'start': self.started,
+                  'wall': wall, 'cpu': cpu, 'peak_rss': self.peak_rss or None, 'rows': self.rows}
+        if self.recorder.trace_allocations:
+            record['peak_alloc'] = self.peak_alloc
+        if exc[0] is not None:
+            record['error'] = exc[0].__name__  # e.g. TrialPruned
+        record.update(self.tags)
+        self.recorder._emit(record)
+
+
+class Recorder:
+    """Opt-in per-stage wall time, CPU time, peak memory and row counts.
+
+    Disabled, stage() returns a shared no-op context and instrument() adds one
+    attribute check per call. Enable it with enable(), or by pointing the
+    TESTBOT_PROFILE environment variable at a JSON lines file. Pool workers
+    forked afterwards record into the same file.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.trace_allocations = False
+        self.records = []
+        self._active = []
+
+    def enable(self, path=None, trace_allocations=False):
+        self.enabled = True
+        self.path = path
+        self.trace_allocations = trace_allocations
+        if trace_allocations:
+            import tracemalloc
+
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+        if self.trace_allocations:
+            import tracemalloc
+
+            tracemalloc.stop()
+            self.trace_allocations = False
+
+    def stage(self, name, rows=None, **tags):
+        """Context manager timing one stage; set `.rows` on it if the count is known only later."""
+        if not self.enabled:
+            return _disabled
+        return _Stage(self, name, rows, tags)
+
+    def instrument(self, name, rows=None, tags=None):
+        """Decorator recording every call as a stage.
+
+        `rows` and `tags` are optional callables taking the call's arguments, and
+        they return the row count and a dict of extra fields (e.g. a trial number).
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                extra = tags(*args, **kwargs) if tags is not None else {}
+                with self.stage(name, **extra) as stage:
+                    result = func(*args, **kwargs)
+                    if rows is not None:
+                        stage.rows = rows(*args, **kwargs)
+                return result
+            return wrapper
+        return decorator
+
+    def _reset_peaks(self):
+        # Fold the current peaks into every open stage before resetting them for the new one
+        self._observe_peaks()
+        _reset_peak_rss()
+        if self.trace_allocations:
+            import tracemalloc
+
+            tracemalloc.reset_peak()
+
+    def _observe_peaks(self):
+        if not self._active:
+            return
+        rss = _peak_rss() or 0
+        alloc = 0
+        if self.trace_allocations:
+            import tracemalloc
+
+            alloc = tracemalloc.get_traced_memory()[1]
+        for stage in self._active:
+            stage.peak_rss = max(stage.peak_rss, rss)
+            stage.peak_alloc = max(stage.peak_alloc, alloc)
+
+    def _emit(self, record):
+        self.records.append(record)
+        if self.path:
+            # One short line per write, so lines from several processes do not interleave
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record, default=str) + '\n')
+
+    def load(self, path=None):
+        """Records from a JSON lines file (default: the one being written), e.g. from all workers."""
+        with open(path or self.path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def summary(self, records=None):
+        records = self.records if records is None else records
+        if not records:
+            return pd.DataFrame()
+        frame = pd.DataFrame(records)
+        frame['rows'] = pd.to_numeric(frame['rows'])
+        table = frame.groupby('stage').agg(
+            calls=('wall', 'size'),
+            wall_total=('wall', 'sum'),
+            wall_mean=('wall', 'mean'),
+            wall_max=('wall', 'max'),
+            cpu_total=('cpu', 'sum'),
+            peak_rss_mb=('peak_rss', lambda x: x.max() / 1024 ** 2),
+            rows=('rows', 'max'),
+        )
+        if 'peak_alloc' in frame:
+            table['peak_alloc_mb'] = frame.groupby('stage')['peak_alloc'].max() / 1024 ** 2
+        return table.sort_values('wall_total', ascending=False)
+
+    def print_summary(self, records=None):
+        table = self.summary(records)
+        if len(table):
+            print(table.to_string(float_format=lambda x: f"{x:.4f}"))
+
+
+profiler = Recorder()
+
+if os.environ.get(ENV_VAR):
+    profiler.enable(os.environ[ENV_VAR])
+    # Spawned workers import this module again, but inherit the launching process's pid here
+    os.environ.setdefault(ENV_VAR + '_PID', str(os.getpid()))
+    _started = time.time()
+
+    def _print_summary_at_exit():
+        # Only the launching process prints, covering what it and its workers wrote during this run
+        if os.environ[ENV_VAR + '_PID'] == str(os.getpid()):
+            print(f"\nStage profile ({profiler.path}):")
+            profiler.print_summary([r for r in profiler.load() if r['start'] >= _started])
+
+    atexit.register(_print_summary_at_exit)
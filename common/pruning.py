@@ -0,0 +1,59 @@
+import numpy as np
+
+from common.kernel import TRADE_DTYPE, BacktestResult, new_state, run_backtest
+
+PRUNERS = ('median', 'percentile', 'hyperband', 'none')
+
+
+def make_pruner(name='median', chunks=4, n_startup_trials=5):
+    """Optuna pruner for studies whose trials report once per backtest chunk."""
+    import optuna
+
+    if name == 'median':
+        return optuna.pruners.MedianPruner(n_startup_trials=n_startup_trials)
+    if name == 'percentile':
+        return optuna.pruners.PercentilePruner(25.0, n_startup_trials=n_startup_trials)
+    if name == 'hyperband':
+        return optuna.pruners.HyperbandPruner(min_resource=1, max_resource=chunks, reduction_factor=3)
+    if name == 'none':
+        return optuna.pruners.NopPruner()
+    raise ValueError(f"unknown pruner {name!r}, expected one of {PRUNERS}")
+
+
+def chunked_backtest(trial, score, close, high, low, signals, chunks=4, start=0, record_returns=True, **kwargs):
+    """run_backtest in `chunks` consecutive time slices, reporting to optuna after each one.
+
+    `signals(start, stop)` returns the (signal, sl, tp) arrays for rows start:stop,
+    so the work for a slice is only done once the slice is reached.
+    `score(trades)` turns the trades closed so far into the trial's intermediate
+    value. The trial is pruned as soon as the study's pruner asks for it, so the
+    later slices are never simulated. With trial=None the result matches one
+    full run_backtest call; record_returns=False skips the per-bar returns there too.
+    """
+    # Convert once up front rather than on every chunk
+    close, high, low = (np.ascontiguousarray(x, dtype=np.float64) for x in (close, high, low))
+    n = len(close)
+    if trial is None:
+        chunks = 1
+    bounds = np.linspace(start, n, max(chunks, 1) + 1).astype(np.int64)
+    signal = np.zeros(n, dtype=np.int64)
+    sl = np.full(n, np.nan)
+    tp = np.full(n, np.nan)
+    state = new_state()
+    returns = np.full(n, np.nan) if record_returns else None
+    parts = []
+    for step, (chunk_start, chunk_stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        # A previous-bar stop reads sl/tp one row back, so fill from the row before the chunk
+        fill_start = max(chunk_start - 1, 0) if step == 0 else chunk_start
+        signal[fill_start:chunk_stop], sl[fill_start:chunk_stop], tp[fill_start:chunk_stop] = signals(fill_start, chunk_stop)
+        result = run_backtest(close, high, low, signal, sl, tp, start=chunk_start, stop=chunk_stop,
+                              state=state, returns=returns, record_returns=record_returns, **kwargs)
+        parts.append(result.trades)
+        if trial is not None and chunk_stop < n:
+            trial.report(score(np.concatenate(parts)), step)
+            if trial.should_prune():
+                import optuna
+
+                raise optuna.TrialPruned()
+    trades = np.concatenate(parts) if parts else np.empty(0, dtype=TRADE_DTYPE)
+    return BacktestResult(returns, trades)
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+DEFAULT_TIMEFRAMES = ('4h', '1D')
+
+# The epoch is a Thursday; weekly buckets start on Monday
+_WEEK = pd.Timedelta('7D').value
+_MONDAY = pd.Timedelta('4D').value
+
+
+def bucket_labels(index_ns, timeframe, offset='0h', tz=None):
+    """Start time (int64 ns, UTC) of the bucket each bar falls in.
+
+    Buckets are `timeframe` long and start `offset` after midnight in `tz` (UTC
+    by default), so e.g. tz='America/New_York', offset='17h' gives FX sessions
+    that follow daylight saving time. Timeframes of whole weeks start on Monday.
+    """
+    index_ns = np.asarray(index_ns, dtype=np.int64)
+    length = pd.Timedelta(timeframe).value
+    origin = pd.Timedelta(offset).value
+    if length % _WEEK == 0:
+        origin += _MONDAY
+
+    local = index_ns
+    if tz is not None:
+        local = pd.DatetimeIndex(index_ns.view('datetime64[ns]')).tz_localize('UTC').tz_convert(tz) \
+            .tz_localize(None).as_unit('ns').asi8
+    labels = (local - origin) // length * length + origin
+    if tz is not None:
+        labels = pd.DatetimeIndex(labels.view('datetime64[ns]')).tz_localize(
+            tz, ambiguous=True, nonexistent='shift_forward').tz_convert('UTC').as_unit('ns').asi8
+    return labels
+
+
+def aggregate(index_ns, values, columns, labels):
+    """OHLC(V) bars per run of equal labels, in one reduceat pass per column."""
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    ends = np.r_[starts[1:], len(labels)] - 1
+    out = np.empty((len(starts), len(columns)))
+    for k, column in enumerate(columns):
+        series = values[:, k]
+        if column == 'Open':
+            out[:, k] = series[starts]
+        elif column == 'High':
+            out[:, k] = np.maximum.reduceat(series, starts)
+        elif column == 'Low':
+            out[:, k] = np.minimum.reduceat(series, starts)
+        elif column == 'Volume':
+            out[:, k] = np.add.reduceat(series, starts)
+        else:  # Close, Adj Close
+            out[:, k] = series[ends]
+    return labels[starts], out
+
+
+class Pyramid:
+    """Higher timeframes derived from one base symbol and kept in the same BarStore.
+
+    Each level is stored as the symbol '<base>@<timeframe>' with the base rows
+    it was built from, so update() only re-aggregates from the last (possibly
+    partial) bucket when base bars are appended.
+    """
+
+    def __init__(self, store, symbol, timeframes=DEFAULT_TIMEFRAMES, offset='0h', tz=None):
+        self.store = store
+        self.symbol = symbol
+        self.timeframes = list(timeframes)
+        self.offset = offset
+        self.tz = tz
+
+    def level_symbol(self, timeframe):
+        return f'{self.symbol}@{timeframe}'
+
+    def _check(self, timeframe, index):
+        if len(index) > 1:
+            spacing = np.median(np.diff(index[-1000:]))
+            if pd.Timedelta(timeframe).value < spacing:
+                raise ValueError(f"cannot derive {timeframe} bars from {pd.Timedelta(int(spacing))} base bars")
+
+    def _source(self, timeframe, index):
+        return {'base': self.symbol, 'timeframe': timeframe, 'offset': self.offset, 'tz': self.tz,
+                'base_rows': len(index), 'base_last': int(index[-1]) if len(index) else None}
+
+    def _write(self, timeframe, columns, index, values, start, existing=None):
+        # Aggregate base rows start: (memory-mapped, so earlier rows are never read) over the stored level
+        labels = bucket_labels(index[start:], timeframe, self.offset, self.tz)
+        times, bars = aggregate(index[start:], np.asarray(values[start:]), columns, labels)
+        frame = pd.DataFrame(bars, columns=columns,
+                             index=pd.DatetimeIndex(times.view('datetime64[ns]')).tz_localize('UTC'))
+        if existing is not None:
+            frame = pd.concat([existing[existing.index < frame.index[0]], frame])
+        return self.store.write(self.level_symbol(timeframe), frame, self._source(timeframe, index))
+
+    def build(self, timeframes=None):
+        columns, index, values = self.store.load_arrays(self.symbol)
+        for timeframe in timeframes or self.timeframes:
+            self._check(timeframe, index)
+            self._write(timeframe, columns, index, values, 0)
+
+    def is_current(self, timeframe):
+        if not self.store.has(self.level_symbol(timeframe)):
+            return False
+        source = self.store.meta(self.level_symbol(timeframe)).get('source') or {}
+        index = self.store.load_arrays(self.symbol)[1]
+        return (source.get('base_rows') == len(index) and source.get('base_last') == int(index[-1])
+                and source.get('offset') == self.offset and source.get('tz') == self.tz)
+
+    def update(self, timeframes=None):
+        """Bring levels up to date with the base bars, re-aggregating only what changed."""
+        columns, index, values = self.store.load_arrays(self.symbol)
+        for timeframe in timeframes or self.timeframes:
+            level = self.level_symbol(timeframe)
+            if self.is_current(timeframe):
+                continue
+            source = {}
+            if self.store.has(level):
+                source = self.store.meta(level).get('source') or {}
+            rows, last = source.get('base_rows'), source.get('base_last')
+            appended = (rows is not None and 0 < rows <= len(index) and int(index[rows - 1]) == last
+                        and source.get('offset') == self.offset and source.get('tz') == self.tz)
+            if not appended:
+                self._check(timeframe, index)
+                self._write(timeframe, columns, index, values, 0)
+                continue
+            # Restart from the first base bar of the last stored bucket, which may have been partial
+            existing = self.store.load(level)
+            start = int(np.searchsorted(index, existing.index[-1].value))
+            self._write(timeframe, columns, index, values, start, existing)
+
+    def load(self, timeframe=None):
+        if timeframe is None:
+            return self.store.load(self.symbol)
+        if timeframe not in self.timeframes:
+            self.timeframes.append(timeframe)
+        self.update([timeframe])
+        return self.store.load(self.level_symbol(timeframe))
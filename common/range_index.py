@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class SparseTable:
+    """O(1) range-min/max queries over a fixed series.
+
+    Level j stores the extremum of every run of 2**j consecutive values, so any
+    window is covered by two (possibly overlapping) entries of a single level.
+    """
+
+    def __init__(self, values, func=np.minimum, max_window=None):
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        self.func = func
+        self.size = len(values)
+        limit = self.size if max_window is None else min(self.size, max_window)
+        self.levels = [values]
+        width = 1
+        while width * 2 <= limit:
+            prev = self.levels[-1]
+            self.levels.append(func(prev[:-width], prev[width:]))
+            width *= 2
+
+    def _level(self, window):
+        level = int(window).bit_length() - 1
+        if level >= len(self.levels):
+            raise ValueError(f"window {window} exceeds the table built for this series")
+        return level
+
+    def query(self, start, stop):
+        # Extremum over values[start:stop] for (arrays of) half-open ranges
+        start = np.asarray(start, dtype=np.int64)
+        stop = np.asarray(stop, dtype=np.int64)
+        length = stop - start
+        if np.any(length <= 0):
+            raise ValueError("empty range")
+        level = np.floor(np.log2(length)).astype(np.int64)
+        if np.any(level >= len(self.levels)):
+            raise ValueError("range exceeds the table built for this series")
+        out = np.empty(np.broadcast(start, stop).shape)
+        for j in np.unique(level):
+            mask = level == j
+            table = self.levels[j]
+            out[mask] = self.func(table[start[mask]], table[stop[mask] - (1 << int(j))])
+        return out
+
+    def rolling(self, window, closed='right'):
+        """Extremum over the `window` bars ending at each bar.
+
+        closed='right' includes the current bar (like pandas rolling), while
+        closed='left' covers the `window` bars before it. Bars without a full
+        window are NaN.
+        """
+        n = self.size
+        out = np.full(n, np.nan)
+        if window > n:
+            return out
+        level = self._level(window)
+        table = self.levels[level]
+        width = 1 << level
+        values = self.func(table[:n - window + 1], table[window - width:n - width + 1])
+        if closed == 'right':
+            out[window - 1:] = values
+        elif closed == 'left':
+            out[window:] = values[:-1]
+        else:
+            raise ValueError("closed must be 'right' or 'left'")
+        return out
+
+
+class DonchianIndex:
+    """Highest-high / lowest-low lookups for any lookback, built once per series."""
+
+    def __init__(self, high, low, max_window=None):
+        self.highs = SparseTable(high, np.maximum, max_window)
+        self.lows = SparseTable(low, np.minimum, max_window)
+
+    def highest(self, window, closed='right'):
+        return self.highs.rolling(window, closed)
+
+    def lowest(self, window, closed='right'):
+        return self.lows.rolling(window, closed)
+
+    def midline(self, window):
+        # (highest high + lowest low) / 2, as used by the Ichimoku conversion/base lines
+        return (self.highest(window) + self.lowest(window)) / 2
@@ -0,0 +1,169 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    dataset TEXT,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+)
+"""
+
+
+def data_hash(values, index=None, columns=None):
+    """Digest of a bar slice: its values, index and column names."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(list(columns or [])).encode())
+    if index is not None:
+        digest.update(np.ascontiguousarray(index, dtype=np.int64))
+    digest.update(np.ascontiguousarray(values, dtype=np.float64))
+    return digest.hexdigest()
+
+
+def _common_modules(namespace):
+    # Names of the shared common.* modules a module namespace refers to
+    for value in namespace.values():
+        used = value.__name__ if inspect.ismodule(value) else getattr(value, '__module__', None)
+        if isinstance(used, str) and (used == 'common' or used.startswith('common.')):
+            yield used
+
+
+def _source_files(namespace, files):
+    for name in _common_modules(namespace):
+        module = sys.modules.get(name)
+        path = getattr(module, '__file__', None)
+        if path is not None and path not in files:
+            files.add(path)
+            _source_files(vars(module), files)
+
+
+def code_version(func):
+    """Digest of the code behind `func`: partial arguments, its qualified name
+    and the source of its file and of the common modules it uses (directly or
+    through other common modules), so editing a strategy or the shared backtest
+    code retires its results."""
+    digest = hashlib.blake2b(digest_size=16)
+    while isinstance(func, functools.partial):
+        digest.update(repr((func.args, sorted(func.keywords.items()))).encode())
+        func = func.func
+    # Past decorators such as profiler.instrument, to the strategy's own function
+    func = inspect.unwrap(func)
+    digest.update(func.__qualname__.encode())
+    files = {inspect.getsourcefile(func)}
+    _source_files(func.__globals__, files)
+    for path in sorted(files):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Backtest and optimizer results kept in a SQLite file across runs.
+
+    Entries are keyed by (data hash, code version, parameters), so changed bars
+    or code simply miss. Entries can be tagged with the dataset (bar store
+    symbol) they were computed on; BarStore.write drops a symbol's entries when
+    its bars change, and the least recently used entries are evicted once the
+    stored results exceed `max_bytes`.
+    """
+
+    def __init__(self, path='.results.sqlite', max_bytes=64 * 1024 ** 2):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connection = None
+
+    def connection(self):
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path)
+            self._connection.execute(SCHEMA)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __getstate__(self):
+        # Workers get the settings and open their own connection
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    @staticmethod
+    def key(data_key, version, params):
+        text = json.dumps([data_key, version, params], sort_keys=True, default=repr)
+        return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+    def get(self, key, default=None):
+        connection = self.connection()
+        row = connection.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        with connection:
+            connection.execute('UPDATE results SET used = ? WHERE key = ?', (time.time(), key))
+        return pickle.loads(row[0])
+
+    def put(self, key, value, dataset=None):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        connection = self.connection()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                               (key, dataset, blob, len(blob), time.time()))
+            self._evict(connection)
+
+    def _evict(self, connection):
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until the rest fit
+        excess = total - self.max_bytes
+        for key, size in connection.execute('SELECT key, size FROM results ORDER BY used').fetchall():
+            if excess <= 0:
+                break
+            connection.execute('DELETE FROM results WHERE key = ?', (key,))
+            excess -= size
+            self.evictions += 1
+
+    def invalidate(self, dataset=None):
+        """Drop the entries computed on `dataset` (and its pyramid levels), or all of them."""
+        connection = self.connection()
+        with connection:
+            if dataset is None:
+                cursor = connection.execute('DELETE FROM results')
+            else:
+                level = dataset + '@'
+                cursor = connection.execute('DELETE FROM results WHERE dataset = ? OR substr(dataset, 1, ?) = ?',
+                                            (dataset, len(level), level))
+        return cursor.rowcount
+
+    def stats(self):
+        entries, size = self.connection().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': size,
+        }
@@ -0,0 +1,62 @@
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+from common.indicator_cache import default_cache
+
+Indicator = namedtuple('Indicator', ['func', 'inputs', 'params'])
+Strategy = namedtuple('Strategy', ['name', 'evaluate', 'indicators'])
+
+
+def indicator(func, *inputs, **params):
+    """Declare func(*bars[inputs], **params); equal declarations are computed once."""
+    return Indicator(func, tuple(inputs), tuple(sorted(params.items())))
+
+
+class StrategyRunner:
+    """Evaluate several strategies on one bar set with one indicator pass.
+
+    Each strategy declares its indicators as {alias: indicator(...)}. run()
+    computes the union of all declarations once, then calls
+    evaluate(bars, indicators) per strategy with the aliases it asked for.
+    evaluate returns a dict of report fields. Indicators go through the
+    indicator cache, so strategy code that looks the same values up there
+    itself gets hits instead of recomputing.
+    """
+
+    def __init__(self, bars, cache=default_cache):
+        self.bars = bars
+        self.cache = cache
+        self.strategies = []
+        self.values = {}
+        self.timings = {}
+
+    def add(self, name, evaluate, **indicators):
+        self.strategies.append(Strategy(name, evaluate, indicators))
+        return self
+
+    def required(self):
+        # Union of every declared indicator, in first-declared order
+        return list(dict.fromkeys(spec for strategy in self.strategies for spec in strategy.indicators.values()))
+
+    def compute_indicators(self):
+        start = time.perf_counter()
+        for spec in self.required():
+            if spec not in self.values:
+                inputs = [self.bars[column] for column in spec.inputs]
+                self.values[spec] = self.cache.compute(spec.func, *inputs, **dict(spec.params))
+        self.timings['indicators'] = time.perf_counter() - start
+        return self.values
+
+    def run(self):
+        self.compute_indicators()
+        rows = []
+        for strategy in self.strategies:
+            values = {alias: self.values[spec] for alias, spec in strategy.indicators.items()}
+            start = time.perf_counter()
+            # A shallow copy shares the bars' memory but keeps added columns out of the shared frame
+            report = strategy.evaluate(self.bars.copy(deep=False), values)
+            self.timings[strategy.name] = time.perf_counter() - start
+            rows.append({'strategy': strategy.name, **report, 'seconds': self.timings[strategy.name]})
+        return pd.DataFrame(rows).set_index('strategy')
@@ -0,0 +1,142 @@
+import numpy as np
+from scipy.optimize import OptimizeResult
+
+
+class Lattice:
+    """Bounded search space where integer parameters move in steps of 1 and
+    continuous ones in steps of (high - low) / resolution.
+
+    Every point is snapped to the lattice, so objectives that truncate or
+    threshold their inputs see each distinct setting once.
+    """
+
+    def __init__(self, bounds, integer=None, resolution=100):
+        self.low = np.array([b[0] for b in bounds], dtype=np.float64)
+        self.high = np.array([b[1] for b in bounds], dtype=np.float64)
+        self.integer = np.zeros(len(bounds), dtype=bool) if integer is None else np.asarray(integer, dtype=bool)
+        self.low[self.integer] = np.ceil(self.low[self.integer])
+        self.high[self.integer] = np.floor(self.high[self.integer])
+        self.step = np.where(self.integer, 1.0, (self.high - self.low) / resolution)
+        self.size = np.round((self.high - self.low) / self.step).astype(np.int64)
+
+    def to_point(self, cell):
+        point = self.low + np.asarray(cell) * self.step
+        return np.where(self.integer, np.round(point), point)
+
+    def to_cell(self, x):
+        cell = np.round((np.asarray(x, dtype=np.float64) - self.low) / self.step).astype(np.int64)
+        return tuple(np.clip(cell, 0, self.size))
+
+
+class MemoizedObjective:
+    """func(x, *args) evaluated at most once per lattice cell; NaN counts as +inf."""
+
+    def __init__(self, func, lattice, args=()):
+        self.func = func
+        self.lattice = lattice
+        self.args = args
+        self.values = {}
+        self.calls = 0
+
+    def __call__(self, cell):
+        self.calls += 1
+        cell = tuple(int(c) for c in cell)
+        value = self.values.get(cell)
+        if value is None:
+            value = float(self.func(self.lattice.to_point(cell), *self.args))
+            if np.isnan(value):
+                # A setting the objective cannot score ranks last instead of stalling the search
+                value = np.inf
+            self.values[cell] = value
+        return value
+
+    def best(self):
+        cell = min(self.values, key=self.values.get)
+        return cell, self.values[cell]
+
+
+def _pattern_search(objective, lattice, start, max_evals):
+    # Compass search on the lattice: try +/- step along each axis, halve the steps when stuck
+    cell = np.array(start, dtype=np.int64)
+    value = objective(cell)
+    steps = np.maximum(lattice.size // 4, 1)
+    iterations = 0
+    while len(objective.values) < max_evals:
+        iterations += 1
+        improved = False
+        for axis in range(len(cell)):
+            for direction in (1, -1):
+                trial = cell.copy()
+                trial[axis] = np.clip(trial[axis] + direction * steps[axis], 0, lattice.size[axis])
+                if trial[axis] == cell[axis]:
+                    continue
+                trial_value = objective(trial)
+                if trial_value < value:
+                    cell, value, improved = trial, trial_value, True
+                    break
+        if not improved:
+            if np.all(steps == 1):
+                break
+            steps = np.maximum(steps // 2, 1)
+    return iterations
+
+
+def minimize_lattice(func, x0, bounds, integer=None, args=(), method='grid', resolution=100,
+                     n_initial=32, max_evals=500, seed=None):
+    """Minimize func over mixed integer/continuous bounds, one backtest per distinct setting.
+
+    method='grid' samples `n_initial` lattice points (plus x0), then refines the
+    best one with a coarse-to-fine compass search. method='tpe' asks optuna's
+    TPE sampler for up to `max_evals` settings instead. Both look every value up
+    in a memo table first, so repeated integer combinations cost nothing.
+    Returns a scipy OptimizeResult; nfev counts distinct evaluations.
+    """
+    lattice = Lattice(bounds, integer, resolution)
+    objective = MemoizedObjective(func, lattice, args)
+    rng = np.random.default_rng(seed)
+
+    if method == 'grid':
+        objective(lattice.to_cell(x0))
+        for _ in range(n_initial):
+            objective(rng.integers(0, lattice.size + 1))
+        start, _ = objective.best()
+        nit = _pattern_search(objective, lattice, start, max_evals)
+    elif method == 'tpe':
+        import optuna
+
+        optuna.logging.set_verbosity(optuna.logging.WARNING)
+        study = optuna.create_study(sampler=optuna.samplers.TPESampler(seed=seed))
+        study.enqueue_trial({f'x{k}': int(c) for k, c in enumerate(lattice.to_cell(x0))})
+        # Each parameter is suggested as its lattice cell, so repeats hit the memo
+        study.optimize(lambda trial: objective([trial.suggest_int(f'x{k}', 0, int(size))
+                                                for k, size in enumerate(lattice.size)]),
+                       n_trials=max_evals)
+        nit = len(study.trials)
+    else:
+        raise ValueError("method must be 'grid' or 'tpe'")
+
+    cell, value = objective.best()
+    return OptimizeResult(x=lattice.to_point(cell), fun=value, nfev=len(objective.values),
+                          ncalls=objective.calls, nit=nit, success=True,
+                          message=f"{len(objective.values)} distinct settings for {objective.calls} requests")
+
+
+def check_nan(seed=0):
+    """Search a grid whose start point and part of whose cells score NaN.
+
+    The objective is NaN for x < 0.5 and (x - 0.9)**2 - 0.99 elsewhere, so the
+    search has to leave the NaN region and find the minimum of -0.99 at 0.9.
+    """
+    def func(x):
+        return np.nan if x[0] < 0.5 else (x[0] - 0.9) ** 2 - 0.99
+
+    for method in ('grid', 'tpe'):
+        result = minimize_lattice(func, [0.1], [(0.0, 1.0)], method=method, max_evals=100, seed=seed)
+        if not np.isclose(result.fun, -0.99) or not np.isclose(result.x[0], 0.9):
+            raise AssertionError(f"{method} search stopped at x={result.x[0]}, fun={result.fun} next to NaN cells")
+    return True
+
+
+if __name__ == "__main__":
+    check_nan()
+    print("Lattice search skips settings scoring NaN.")
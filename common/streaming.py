@@ -0,0 +1,168 @@
+import math
+from collections import deque
+
+import numpy as np
+
+NAN = float('nan')
+
+
+class EMA:
+    """Exponential moving average seeded with the first value (ewm adjust=False)."""
+
+    def __init__(self, period, field='Close'):
+        self.alpha = 2.0 / (period + 1)
+        self.field = field
+        self.value = NAN
+
+    def push(self, x):
+        self.value = x if self.value != self.value else self.value + self.alpha * (x - self.value)
+        return self.value
+
+    def update(self, bar):
+        return self.push(bar[self.field])
+
+
+class TrueRange:
+    def __init__(self):
+        self.previous_close = NAN
+        self.value = NAN
+
+    def update(self, bar):
+        high, low = bar['High'], bar['Low']
+        if self.previous_close != self.previous_close:  # First bar: no previous close
+            self.value = high - low
+        else:
+            self.value = max(high - low, abs(high - self.previous_close), abs(low - self.previous_close))
+        self.previous_close = bar['Close']
+        return self.value
+
+
+class SMA:
+    """Simple moving average over a fixed ring buffer; NaN until the window is full."""
+
+    def __init__(self, period, field='Close'):
+        self.period = period
+        self.field = field
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+        self.count = 0
+        self.value = NAN
+
+    def push(self, x):
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(x)
+        self.total += x
+        self.count += 1
+        if self.count % self.period == 0:
+            self.total = math.fsum(self.window)  # Stop the running sum from drifting
+        self.value = self.total / self.period if len(self.window) == self.period else NAN
+        return self.value
+
+    def update(self, bar):
+        return self.push(bar[self.field])
+
+
+class ATR:
+    """Simple moving average of the true range, as cTrader's AverageTrueRange(Simple)."""
+
+    def __init__(self, period):
+        self.true_range = TrueRange()
+        self.average = SMA(period)
+        self.value = NAN
+
+    def update(self, bar):
+        self.value = self.average.push(self.true_range.update(bar))
+        return self.value
+
+
+class RollingExtremum:
+    """Rolling max (or min) over the last `period` values using a monotonic deque."""
+
+    def __init__(self, period, field, maximum=True):
+        self.period = period
+        self.field = field
+        self.maximum = maximum
+        self.candidates = deque()  # (position, value), values monotonic from the front
+        self.count = 0
+        self.value = NAN
+
+    def push(self, x):
+        candidates = self.candidates
+        if self.maximum:
+            while candidates and candidates[-1][1] <= x:
+                candidates.pop()
+        else:
+            while candidates and candidates[-1][1] >= x:
+                candidates.pop()
+        candidates.append((self.count, x))
+        if candidates[0][0] <= self.count - self.period:
+            candidates.popleft()
+        self.count += 1
+        self.value = candidates[0][1] if self.count >= self.period else NAN
+        return self.value
+
+    def update(self, bar):
+        return self.push(bar[self.field])
+
+
+class DonchianMidline:
+    """(highest high + lowest low) / 2 over `period` bars: the Ichimoku conversion/base line."""
+
+    def __init__(self, period):
+        self.highest = RollingExtremum(period, 'High', maximum=True)
+        self.lowest = RollingExtremum(period, 'Low', maximum=False)
+        self.value = NAN
+
+    def update(self, bar):
+        self.value = (self.highest.update(bar) + self.lowest.update(bar)) / 2
+        return self.value
+
+
+class FisherTransform:
+    """Cumulative Fisher transform of the close within its `period` high/low range."""
+
+    def __init__(self, period):
+        self.highest = RollingExtremum(period, 'High', maximum=True)
+        self.lowest = RollingExtremum(period, 'Low', maximum=False)
+        self.total = 0.0
+        self.value = NAN
+
+    def update(self, bar):
+        high = self.highest.update(bar)
+        low = self.lowest.update(bar)
+        if high == high and high != low:
+            value = 0.33 * 2 * ((bar['Close'] - low) / (high - low) - 0.5)
+            self.total += math.log((1 + value) / (1 - value))
+            self.value = self.total
+        else:
+            # Like the batch cumsum, a bar without a value is NaN and leaves the sum unchanged
+            self.value = NAN
+        return self.value
+
+
+def check_parity(n=5000, seed=0):
+    """Replay random bars through the streaming indicators and compare with the batch versions."""
+    from common import indicators
+
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, n))
+    high = close + rng.random(n)
+    low = close - rng.random(n)
+    streams = {
+        'ema': (EMA(50), indicators.ema(close, 50)),
+        'atr': (ATR(14), indicators.atr(high, low, close, 14)),
+        'conversion': (DonchianMidline(9), indicators.donchian_midline(high, low, 9)),
+        'base': (DonchianMidline(26), indicators.donchian_midline(high, low, 26)),
+        'fisher': (FisherTransform(10), indicators.fisher_transform(high, low, close, 10)),
+    }
+    for name, (stream, batch) in streams.items():
+        values = np.array([stream.update({'High': h, 'Low': l, 'Close': c}) for h, l, c in zip(high, low, close)])
+        if not np.allclose(values, batch, rtol=1e-9, atol=1e-9, equal_nan=True):
+            raise AssertionError(f"streaming {name} differs from the batch implementation")
+    return True
+
+
+if __name__ == "__main__":
+    check_parity()
+    print("Streaming indicators match the batch implementations.")
@@ -0,0 +1,243 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from common.result_cache import code_version, data_hash
+
+
+def _attach_shared_memory(name):
+    # Only the creating process unlinks the block. Python < 3.13 always registers
+    # attachments, which is harmless because pool workers share the creator's tracker.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedBars:
+    """Numeric bar columns (plus an optional datetime index) in one shared memory block.
+
+    Workers attach by name and get a read-only DataFrame over the same buffer,
+    so the bars are copied into shared memory once instead of pickled per task.
+    """
+
+    def __init__(self, shm, spec, owner=False):
+        self.shm = shm
+        self.spec = spec
+        self.owner = owner
+        n, k = spec['rows'], len(spec['columns'])
+        self.values = np.ndarray((n, k), dtype=np.float64, buffer=shm.buf)
+        self.values.flags.writeable = owner
+        self.index = None
+        if spec['has_index']:
+            self.index = np.ndarray(n, dtype=np.int64, buffer=shm.buf, offset=n * k * 8)
+
+    @classmethod
+    def create(cls, data, columns=None):
+        if columns is None:
+            columns = [c for c in data.columns if pd.api.types.is_numeric_dtype(data[c])]
+        columns = list(columns)
+        n, k = len(data), len(columns)
+        has_index = isinstance(data.index, pd.DatetimeIndex)
+        shm = shared_memory.SharedMemory(create=True, size=max(n * (k + 1) * 8, 1))
+        spec = {
+            'name': shm.name,
+            'rows': n,
+            'columns': columns,
+            'has_index': has_index,
+            'index_name': data.index.name,
+            'tz': str(data.index.tz) if has_index and data.index.tz is not None else None,
+        }
+        bars = cls(shm, spec, owner=True)
+        bars.values[:] = data[columns].to_numpy(dtype=np.float64)
+        if has_index:
+            bars.index[:] = data.index.as_unit('ns').asi8
+        bars.values.flags.writeable = False
+        return bars
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(_attach_shared_memory(spec['name']), spec)
+
+    def frame(self, start=None, stop=None):
+        # Zero-copy DataFrame over rows start:stop of the shared block
+        values = self.values[start:stop]
+        index = None
+        if self.index is not None:
+            index = pd.DatetimeIndex(self.index[start:stop].view('datetime64[ns]'), name=self.spec['index_name'])
+            if self.spec['tz'] is not None:
+                index = index.tz_localize('UTC').tz_convert(self.spec['tz'])
+        elif start is not None:
+            index = pd.RangeIndex(*slice(start, stop).indices(self.spec['rows']))
+        return pd.DataFrame(values, columns=self.spec['columns'], index=index, copy=False)
+
+    def close(self):
+        self.values = None
+        self.index = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# Per-process state set up by the pool initializer
+_worker_bars = None
+_worker_frame = None
+
+
+def _init_worker(spec):
+    global _worker_bars, _worker_frame
+    _worker_bars = SharedBars.attach(spec)
+    _worker_frame = _worker_bars.frame()
+
+
+def _evaluate(func, params):
+    return func(_worker_frame, params)
+
+
+def _evaluate_fold(fit, evaluate, fold, warmup):
+    # Train and test windows are views into the shared block, never copies
+    train = _worker_bars.frame(fold.train_start, fold.train_stop)
+    params = fit(train)
+    lead = min(warmup, fold.test_start)
+    test = _worker_bars.frame(fold.test_start - lead, fold.test_stop)
+    return params, evaluate(train, params, 0), evaluate(test, params, lead)
+
+
+def _evaluate_trial(objective, params, distributions=None, snapshot=None):
+    import optuna
+
+    if snapshot is None:
+        trial = optuna.trial.FixedTrial(params)
+    else:
+        # Rebuild the study's finished trials locally so report/should_prune compare
+        # this trial against everything that had finished when it was submitted
+        directions, pruner, history = snapshot
+        optuna.logging.set_verbosity(optuna.logging.WARNING)
+        local = optuna.create_study(directions=directions, pruner=pruner)
+        local.add_trials(history)
+        local.enqueue_trial(params)
+        trial = local.ask(distributions)
+
+    def intermediate():
+        return {} if snapshot is None else local.trials[-1].intermediate_values
+
+    try:
+        return 'complete', objective(trial, _worker_frame), intermediate()
+    except optuna.TrialPruned:
+        return 'pruned', None, intermediate()
+    except Exception as e:
+        return 'fail', repr(e), {}
+
+
+class SweepExecutor:
+    """Fan parameter evaluations out over a process pool that shares one copy of the bars.
+
+    Sweep functions are called as func(data, params) and optuna objectives as
+    objective(trial, data), where `data` is the worker's view of the shared bars.
+    If the study has a pruner, trial.report/should_prune work inside the workers
+    against the trials that had finished when each trial was handed out.
+
+    With a ResultCache, map() and optimize() look every parameter set up first
+    (keyed by the shared bars, the function's code and the parameters) and only
+    evaluate the misses; `dataset` tags the stored results with the bar store
+    symbol the data came from, so they are dropped when it is rewritten.
+    """
+
+    def __init__(self, data, processes=None, columns=None, cache=None, dataset=None):
+        self.bars = SharedBars.create(data, columns)
+        self.processes = processes or os.cpu_count()
+        self.pool = ProcessPoolExecutor(self.processes, initializer=_init_worker,
+                                        initargs=(self.bars.spec,))
+        self.cache = cache
+        self.dataset = dataset
+        self.data_key = None
+        if cache is not None:
+            self.data_key = data_hash(self.bars.values, self.bars.index, self.bars.spec['columns'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+        self.bars.close()
+
+    def cache_key(self, func, params, version=None):
+        return self.cache.key(self.data_key, version or code_version(func), params)
+
+    def map(self, func, param_list):
+        if self.cache is None:
+            futures = [self.pool.submit(_evaluate, func, params) for params in param_list]
+            return [future.result() for future in futures]
+
+        version = code_version(func)
+        keys = [self.cache_key(func, params, version) for params in param_list]
+        missing = object()
+        results = [self.cache.get(key, missing) for key in keys]
+        futures = {i: self.pool.submit(_evaluate, func, params)
+                   for i, params in enumerate(param_list) if results[i] is missing}
+        for i, future in futures.items():
+            results[i] = future.result()
+            self.cache.put(keys[i], results[i], self.dataset)
+        return results
+
+    def walk_forward(self, fit, evaluate, folds, warmup=0):
+        # One task per fold; see common.walkforward for the fit/evaluate contract
+        futures = [self.pool.submit(_evaluate_fold, fit, evaluate, fold, warmup) for fold in folds]
+        return [future.result() for future in futures]
+
+    def optimize(self, study, objective, n_trials, search_space=None):
+        import optuna
+
+        version = code_version(objective) if self.cache is not None else None
+        if search_space is None:
+            # Let the objective define the search space on one trial run in this process
+            study.optimize(lambda trial: objective(trial, self.bars.frame()), n_trials=1)
+            search_space = study.trials[-1].distributions
+            n_trials -= 1
+            if self.cache is not None and study.trials[-1].state == optuna.trial.TrialState.COMPLETE:
+                self.cache.put(self.cache_key(objective, study.trials[-1].params, version),
+                               study.trials[-1].value, self.dataset)
+
+        prunes = not isinstance(study.pruner, optuna.pruners.NopPruner)
+        finished = (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)
+
+        pending = {}
+        asked = 0
+        while asked < n_trials or pending:
+            # Keep every worker busy, asking for a new trial as soon as one finishes
+            while asked < n_trials and len(pending) < self.processes:
+                trial = study.ask(search_space)
+                asked += 1
+                if self.cache is not None:
+                    # Parameter sets scored by an earlier study on the same bars and code are not rerun
+                    key = self.cache_key(objective, trial.params, version)
+                    value = self.cache.get(key)
+                    if value is not None:
+                        study.tell(trial, value)
+                        continue
+                snapshot = None
+                if prunes:
+                    snapshot = (study.directions, study.pruner, study.get_trials(deepcopy=False, states=finished))
+                pending[self.pool.submit(_evaluate_trial, objective, trial.params, search_space, snapshot)] = trial
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                trial = pending.pop(future)
+                status, value, intermediate = future.result()
+                for step, step_value in intermediate.items():
+                    trial.report(step_value, step)
+                if status == 'complete':
+                    study.tell(trial, value)
+                    if self.cache is not None:
+                        self.cache.put(self.cache_key(objective, trial.params, version), value, self.dataset)
+                elif status == 'pruned':
+                    study.tell(trial, state=optuna.trial.TrialState.PRUNED)
+                else:
+                    print(f"Trial {trial.number} failed: {value}")
+                    study.tell(trial, state=optuna.trial.TrialState.FAIL)
+        return study
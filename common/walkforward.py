@@ -0,0 +1,71 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from common.sweep import SweepExecutor
+
+Fold = namedtuple('Fold', ['fold', 'train_start', 'train_stop', 'test_start', 'test_stop'])
+
+
+def walk_forward_splits(n, folds, train_size=None, test_size=None, anchored=False):
+    """Consecutive out-of-sample windows covering the end of `n` bars.
+
+    Each test window follows its training window. Rolling windows keep
+    `train_size` bars and anchored windows always start at bar 0. By default
+    the bars are cut into folds + 1 equal parts, so the first fold trains on the
+    first part and the test windows cover the rest.
+    """
+    if test_size is None:
+        test_size = n // (folds + 1)
+    if train_size is None:
+        train_size = n - folds * test_size
+    if test_size < 1 or train_size < 1 or train_size + folds * test_size > n:
+        raise ValueError(f"cannot fit {folds} folds of {test_size} test bars after {train_size} training bars in {n} bars")
+
+    splits = []
+    for k in range(folds):
+        test_start = n - (folds - k) * test_size
+        train_start = 0 if anchored else test_start - train_size
+        splits.append(Fold(k, train_start, test_start, test_start, test_start + test_size))
+    return splits
+
+
+def walk_forward(data, fit, evaluate, folds=10, train_size=None, test_size=None, anchored=False,
+                 warmup=0, processes=None, columns=None):
+    """Optimize on each training window and score the result on the window after it.
+
+    `fit(train)` returns the fold's parameters and `evaluate(data, params, start)`
+    scores them on `data` from row `start` on. Test windows are handed over with
+    up to `warmup` preceding bars so indicators are settled when the fold
+    starts. Folds run concurrently on a SweepExecutor pool. `fit` and `evaluate`
+    must therefore be module-level functions (or partials of them).
+    """
+    splits = walk_forward_splits(len(data), folds, train_size, test_size, anchored)
+    with SweepExecutor(data, processes, columns) as executor:
+        results = executor.walk_forward(fit, evaluate, splits, warmup)
+
+    rows = []
+    for split, (params, in_sample, out_of_sample) in zip(splits, results):
+        row = split._asdict()
+        if isinstance(data.index, pd.DatetimeIndex):
+            row['train_from'] = data.index[split.train_start]
+            row['test_from'] = data.index[split.test_start]
+            row['test_to'] = data.index[split.test_stop - 1]
+        row['params'] = params
+        row['in_sample'] = in_sample
+        row['out_of_sample'] = out_of_sample
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('fold')
+
+
+def summarize(report):
+    # Stitched out-of-sample score against the average in-sample one
+    out_of_sample = report['out_of_sample'].astype(float)
+    return {
+        'folds': len(report),
+        'out_of_sample_total': out_of_sample.sum(),
+        'out_of_sample_mean': out_of_sample.mean(),
+        'in_sample_mean': report['in_sample'].astype(float).mean(),
+        'positive_folds': float(np.mean(out_of_sample > 0)),
+    }
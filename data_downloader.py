@@ -1,15 +1,21 @@
-import yfinance as yf
 import pandas as pd
 
+from common.bar_store import read_bars
+from common.downloader import Downloader
+
 # Define the ticker symbol for NAS100 futures
 ticker_symbol = "NQ=F"
 
 # Download the data
-# Set the period and interval
-data = yf.download(tickers=ticker_symbol, period="2y", interval="60m")
+# Set the period and interval; only the bars since the last cached one are fetched
+start = pd.Timestamp.now(tz='UTC') - pd.DateOffset(years=2)
+data = Downloader().load(ticker_symbol, interval="60m", start=start)
 
 # Display the first few rows of the data
 print(data.head())
 
 # Optionally, save the data to a CSV file
-data.to_csv('nas100_futures_1h.csv')
\ No newline at end of file
+data.to_csv('nas100_futures_1h.csv')
+
+# Ingest into the bar store so the strategy scripts can memory-map it
+read_bars('nas100_futures_1h.csv')
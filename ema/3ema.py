@@ -1,85 +1,141 @@
 import pandas as pd
 import numpy as np
-import yfinance as yf
 import optuna
+import argparse
+import functools
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import indicators
+from common.downloader import Downloader
+from common.indicator_cache import default_cache
+from common.intrabar import IntrabarResolver
+from common.metrics import trade_metrics
+from common.profiling import profiler
+from common.pruning import PRUNERS, chunked_backtest, make_pruner
+from common.sweep import SweepExecutor
+from common.walkforward import summarize, walk_forward
 
 def fetch_data(symbol, start_date, end_date, interval):
-    data = yf.download(symbol, start=start_date, end=end_date, interval=interval)
+    # Served from the local bar cache; only the missing tail is downloaded
+    data = Downloader().load(symbol, interval=interval, start=start_date, end=end_date)
     return data
 
 def ema(data, period):
-    return data.ewm(span=period, adjust=False).mean()
+    # Each distinct period is computed once per data set across all trials
+    return pd.Series(default_cache.compute(indicators.ema, data, period=period), index=data.index)
 
-def backtest(data, short_period, medium_period, long_period, tp_percent, sl_percent):
-    data['EMA_Short'] = ema(data['Close'], short_period)
-    data['EMA_Medium'] = ema(data['Close'], medium_period)
-    data['EMA_Long'] = ema(data['Close'], long_period)
-    
-    position = 0
-    entry_price = 0
-    trades = []
-    
-    for i in range(len(data)):
-        if position == 0:
-            if data['EMA_Short'][i] > data['EMA_Medium'][i] and data['EMA_Long'][i] > data['Close'][i-1]:
-                position = 1
-                entry_price = data['Close'][i]
-            elif data['EMA_Short'][i] < data['EMA_Medium'][i] and data['EMA_Long'][i] < data['Close'][i-1]:
-                position = -1
-                entry_price = data['Close'][i]
-        else:
-            if position == 1:
-                stop_loss = entry_price * (1 - sl_percent)
-                take_profit = entry_price * (1 + tp_percent)
-                if data['Low'][i] <= stop_loss or data['High'][i] >= take_profit:
-                    exit_price = stop_loss if data['Low'][i] <= stop_loss else take_profit
-                    trades.append((entry_price, exit_price))
-                    position = 0
-            else:  # position == -1
-                stop_loss = entry_price * (1 + sl_percent)
-                take_profit = entry_price * (1 - tp_percent)
-                if data['High'][i] >= stop_loss or data['Low'][i] <= take_profit:
-                    exit_price = stop_loss if data['High'][i] >= stop_loss else take_profit
-                    trades.append((entry_price, exit_price))
-                    position = 0
-    
-    if trades:
-        trades_df = pd.DataFrame(trades, columns=['Entry', 'Exit'])
-        trades_df['PnL'] = trades_df['Exit'] - trades_df['Entry']
-        total_pnl = trades_df['PnL'].sum()
-        win_rate = (trades_df['PnL'] > 0).mean()
-        return total_pnl, win_rate
-    else:
-        return 0, 0
-
-def optimize(trial):
+def trade_pnl(trades):
+    return (trades['exit_price'] - trades['entry_price']).sum()
+
+def backtest(data, short_period, medium_period, long_period, tp_percent, sl_percent, start=0, trial=None, chunks=4,
+             intrabar=None):
+    # data is only read, so concurrent trials can share one frame
+    close = data['Close'].to_numpy(dtype=float)
+    ema_short = ema(data['Close'], short_period).to_numpy()
+    ema_medium = ema(data['Close'], medium_period).to_numpy()
+    ema_long = ema(data['Close'], long_period).to_numpy()
+
+    def signals(start, stop):
+        # Bar 0 compares against the last close, as before
+        previous_close = np.concatenate((close[-1:], close[:stop - 1])) if start == 0 else close[start - 1:stop - 1]
+        short, medium, long = ema_short[start:stop], ema_medium[start:stop], ema_long[start:stop]
+        signal = np.where((short > medium) & (long > previous_close), 1,
+                          np.where((short < medium) & (long < previous_close), -1, 0))
+        stop_loss = close[start:stop] * (1 - signal * sl_percent)
+        take_profit = close[start:stop] * (1 + signal * tp_percent)
+        return signal, stop_loss, take_profit
+
+    # With a trial, the PnL so far is reported after each chunk so weak trials can be pruned.
+    # An intrabar resolver re-decides bars that touched both SL and TP from lower-timeframe bars
+    result = chunked_backtest(trial, trade_pnl, close, data['High'], data['Low'], signals,
+                              chunks=chunks, start=start, record_returns=False, stops='entry', on_opposite='ignore',
+                              index=data.index, intrabar=intrabar)
+    trades = result.trades
+    metrics = trade_metrics(trades, pnl=trades['exit_price'] - trades['entry_price'])
+    return metrics['total'], metrics['win_rate']
+
+@profiler.instrument('3ema.trial', rows=lambda trial, data, **kwargs: len(data),
+                     tags=lambda trial, data, **kwargs: {'trial': trial.number})
+def optimize(trial, data, intrabar=None):
     short_period = trial.suggest_int('short_period', 5, 20)
     medium_period = trial.suggest_int('medium_period', 20, 50)
     long_period = trial.suggest_int('long_period', 50, 200)
     tp_percent = trial.suggest_float('tp_percent', 0.01, 0.1)
     sl_percent = trial.suggest_float('sl_percent', 0.01, 0.1)
     
-    total_pnl, win_rate = backtest(data, short_period, medium_period, long_period, tp_percent, sl_percent)
+    total_pnl, win_rate = backtest(data, short_period, medium_period, long_period, tp_percent, sl_percent, trial=trial,
+                                   intrabar=intrabar)
     
     return total_pnl
 
-# Fetch historical data for US30
-symbol = '^DJI'  # Yahoo Finance symbol for the Dow Jones Industrial Average
-start_date = '2010-01-01'
-end_date = '2023-06-08'
-interval = '1h'
-
-data = fetch_data(symbol, start_date, end_date, interval)
-
-# Optimize
-study = optuna.create_study(direction='maximize')
-study.optimize(optimize, n_trials=100)
-
-# Print the best parameters and results
-print("Best parameters:")
-print(f"Short Period: {study.best_params['short_period']}")
-print(f"Medium Period: {study.best_params['medium_period']}")
-print(f"Long Period: {study.best_params['long_period']}")
-print(f"Take Profit (%): {study.best_params['tp_percent']:.2%}")
-print(f"Stop Loss (%): {study.best_params['sl_percent']:.2%}")
-print(f"Best PnL: {study.best_value:.2f}")
\ No newline at end of file
+def fit_fold(data, n_trials=100, intrabar=None):
+    # In-sample study for one walk-forward fold, run serially inside its worker
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = optuna.create_study(direction='maximize')
+    study.optimize(lambda trial: optimize(trial, data, intrabar), n_trials=n_trials)
+    return study.best_params
+
+def evaluate_fold(data, params, start=0, intrabar=None):
+    total_pnl, win_rate = backtest(data, start=start, intrabar=intrabar, **params)
+    return total_pnl
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--walk-forward', type=int, default=0, metavar='FOLDS',
+                        help='optimize and test out of sample over this many folds instead')
+    parser.add_argument('--anchored', action='store_true', help='grow training windows from the first bar')
+    parser.add_argument('--pruner', choices=PRUNERS, default='median', help='how to stop unpromising trials early')
+    parser.add_argument('--intrabar', metavar='INTERVAL',
+                        help='resolve bars touching both SL and TP from cached bars of this interval (e.g. 5m)')
+    parser.add_argument('--no-cache', action='store_true', help='rerun parameter sets scored by earlier studies')
+    args = parser.parse_args()
+
+    # Fetch historical data for US30
+    symbol = '^DJI'  # Yahoo Finance symbol for the Dow Jones Industrial Average
+    start_date = '2010-01-01'
+    end_date = '2023-06-08'
+    interval = '1h'
+
+    data = fetch_data(symbol, start_date, end_date, interval)
+
+    intrabar = None
+    if args.intrabar:
+        # Lower-timeframe bars go into the same bar store; only ambiguous bars ever read them
+        downloader = Downloader()
+        downloader.update([symbol], interval=args.intrabar, start=start_date, end=end_date)
+        intrabar = IntrabarResolver(downloader.store, Downloader.symbol(symbol, args.intrabar))
+
+    if args.walk_forward:
+        # Each fold runs its own 100-trial study; folds share the bars and run in parallel
+        report = walk_forward(data, functools.partial(fit_fold, intrabar=intrabar),
+                              functools.partial(evaluate_fold, intrabar=intrabar),
+                              folds=args.walk_forward, anchored=args.anchored,
+                              warmup=200, columns=['Open', 'High', 'Low', 'Close'])
+        for fold, row in report.iterrows():
+            print(f"Fold {fold}: test from {row['test_from']} | in-sample PnL {row['in_sample']:.2f} | "
+                  f"out-of-sample PnL {row['out_of_sample']:.2f} | {row['params']}")
+        summary = summarize(report)
+        print(f"Out-of-sample PnL: {summary['out_of_sample_total']:.2f}")
+        print(f"Profitable folds: {summary['positive_folds']:.0%}")
+        sys.exit()
+
+    # Optimize, spreading the trials over all cores; parameter sets already scored on
+    # these bars with this code come from the bar store's result cache
+    cache = None if args.no_cache else Downloader().store.result_cache()
+    study = optuna.create_study(direction='maximize', pruner=make_pruner(args.pruner))
+    with SweepExecutor(data, columns=['Open', 'High', 'Low', 'Close'], cache=cache,
+                       dataset=Downloader.symbol(symbol, interval)) as executor:
+        executor.optimize(study, functools.partial(optimize, intrabar=intrabar), n_trials=100)
+
+    # Print the best parameters and results
+    print("Best parameters:")
+    print(f"Short Period: {study.best_params['short_period']}")
+    print(f"Medium Period: {study.best_params['medium_period']}")
+    print(f"Long Period: {study.best_params['long_period']}")
+    print(f"Take Profit (%): {study.best_params['tp_percent']:.2%}")
+    print(f"Stop Loss (%): {study.best_params['sl_percent']:.2%}")
+    print(f"Best PnL: {study.best_value:.2f}")
+    if cache is not None:
+        print(f"Result cache: {cache.stats()}")
\ No newline at end of file
@@ -2,117 +2,131 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.optimize import minimize
-import pandas_montecarlo
+import argparse
+import os
+import sys
 
-def ichimoku_cloud(data, conversion_period, base_period):
-    high = data['High']
-    low = data['Low']
-    conversion_line = (high.rolling(window=conversion_period).max() + low.rolling(window=conversion_period).min()) / 2
-    base_line = (high.rolling(window=base_period).max() + low.rolling(window=base_period).min()) / 2
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import indicators
+from common.bar_store import read_bars
+from common.indicator_cache import default_cache
+from common.kernel import run_backtest
+from common.montecarlo import montecarlo
+from common.profiling import profiler
+from common.range_index import DonchianIndex
+from common.search import minimize_lattice
+from common.walkforward import summarize, walk_forward
+
+def ichimoku_cloud(data, conversion_period, base_period, index=None):
+    # Pass a prebuilt DonchianIndex to avoid rolling over the data for every period
+    if index is None:
+        index = DonchianIndex(data['High'], data['Low'], max_window=max(conversion_period, base_period))
     return pd.DataFrame({
-        'Conversion Line': conversion_line,
-        'Base Line': base_line,
-    })
+        'Conversion Line': index.midline(conversion_period),
+        'Base Line': index.midline(base_period),
+    }, index=data.index)
 
 def calculate_signals(data, ichimoku, ema_period, atr_period, sl_multiplier, tp_multiplier):
+    # Indicators stay local (and cached), so data is never written to
+    ema = default_cache.compute(indicators.ema, data['Close'], period=ema_period)
+    atr = default_cache.compute(indicators.range_atr, data['High'], data['Low'], period=atr_period)
+
+    conversion_line = ichimoku['Conversion Line'].to_numpy()
+    base_line = ichimoku['Base Line'].to_numpy()
+    close = data['Close'].to_numpy()
+    buy_condition = (conversion_line > base_line) & (close > ema)
+    sell_condition = (conversion_line < base_line) & (close < ema)
+
+    # Long: SL below and TP above the close; short: the other way round
     signals = pd.DataFrame(index=data.index)
-    signals['Signal'] = 0
-    signals['SL'] = 0.0
-    signals['TP'] = 0.0
-    
-    data['EMA'] = data['Close'].ewm(span=ema_period, adjust=False).mean()
-    data['ATR'] = data['High'].sub(data['Low']).rolling(window=atr_period).mean()
-    
-    buy_condition = (ichimoku['Conversion Line'] > ichimoku['Base Line']) & (data['Close'] > data['EMA'])
-    signals.loc[buy_condition, 'Signal'] = 1
-    
-    sell_condition = (ichimoku['Conversion Line'] < ichimoku['Base Line']) & (data['Close'] < data['EMA'])
-    signals.loc[sell_condition, 'Signal'] = -1
-    
-    long_signals = signals['Signal'] == 1
-    short_signals = signals['Signal'] == -1
-    
-    signals.loc[long_signals, 'SL'] = data.loc[long_signals, 'Close'] - (data.loc[long_signals, 'ATR'] * sl_multiplier)
-    signals.loc[long_signals, 'TP'] = data.loc[long_signals, 'Close'] + (data.loc[long_signals, 'ATR'] * tp_multiplier)
-    signals.loc[short_signals, 'SL'] = data.loc[short_signals, 'Close'] + (data.loc[short_signals, 'ATR'] * sl_multiplier)
-    signals.loc[short_signals, 'TP'] = data.loc[short_signals, 'Close'] - (data.loc[short_signals, 'ATR'] * tp_multiplier)
-    
+    signals['Signal'] = np.where(buy_condition, 1, np.where(sell_condition, -1, 0))
+    side = signals['Signal'].to_numpy()
+    signals['SL'] = np.where(side != 0, close - side * atr * sl_multiplier, 0.0)
+    signals['TP'] = np.where(side != 0, close + side * atr * tp_multiplier, 0.0)
     return signals
 
-def calculate_returns(data, signals):
-    returns = pd.Series(index=signals.index)
-    position = 0
-    entry_price = 0
-    
-    for i in range(1, len(signals)):
-        if position == 0:
-            if signals['Signal'].iloc[i] == 1:
-                position = 1
-                entry_price = data['Close'].iloc[i]
-            elif signals['Signal'].iloc[i] == -1:
-                position = -1
-                entry_price = data['Close'].iloc[i]
-        elif position == 1:
-            if data['Low'].iloc[i] <= signals['SL'].iloc[i-1]:
-                returns.iloc[i] = (signals['SL'].iloc[i-1] - entry_price) / entry_price
-                position = 0
-            elif data['High'].iloc[i] >= signals['TP'].iloc[i-1]:
-                returns.iloc[i] = (signals['TP'].iloc[i-1] - entry_price) / entry_price
-                position = 0
-            elif signals['Signal'].iloc[i] == -1:
-                returns.iloc[i] = (data['Close'].iloc[i] - entry_price) / entry_price
-                position = -1
-                entry_price = data['Close'].iloc[i]
-        elif position == -1:
-            if data['High'].iloc[i] >= signals['SL'].iloc[i-1]:
-                returns.iloc[i] = (entry_price - signals['SL'].iloc[i-1]) / entry_price
-                position = 0
-            elif data['Low'].iloc[i] <= signals['TP'].iloc[i-1]:
-                returns.iloc[i] = (entry_price - signals['TP'].iloc[i-1]) / entry_price
-                position = 0
-            elif signals['Signal'].iloc[i] == 1:
-                returns.iloc[i] = (entry_price - data['Close'].iloc[i]) / entry_price
-                position = 1
-                entry_price = data['Close'].iloc[i]
-    
-    return returns
+def calculate_returns(data, signals, start=1):
+    # Bars before `start` only warm the indicators up; no trades are taken there
+    result = run_backtest(data['Close'], data['High'], data['Low'],
+                          signals['Signal'], signals['SL'], signals['TP'],
+                          stops='previous_bar', on_opposite='reverse', start=max(start, 1))
+    return pd.Series(result.returns, index=signals.index)
 
-def objective_function(params, data):
+@profiler.instrument('slope.objective', rows=lambda params, data, *args, **kwargs: len(data))
+def objective_function(params, data, index=None):
     conversion_period, base_period, ema_period, atr_period, sl_multiplier, tp_multiplier = params
     conversion_period = max(1, int(conversion_period))
     base_period = max(1, int(base_period))
     ema_period = max(1, int(ema_period))
     atr_period = max(1, int(atr_period))
     
-    ichimoku = ichimoku_cloud(data, conversion_period, base_period)
+    ichimoku = ichimoku_cloud(data, conversion_period, base_period, index)
     signals = calculate_signals(data, ichimoku, ema_period, atr_period, sl_multiplier, tp_multiplier)
     returns = calculate_returns(data, signals)
     
-    if returns.empty or returns.iloc[-1] != returns.iloc[-1]:  # Check for empty Series or NaN
+    if returns.empty or returns.isna().all():  # No trade closed (bars without an exit are NaN)
         return 0
     
     return -returns.sum()  # Negative because we want to maximize returns
 
-def optimize_parameters(data):
+@profiler.instrument('slope.optimize', rows=lambda data, *args, **kwargs: len(data))
+def optimize_parameters(data, method='grid'):
     initial_params = [9, 26, 50, 14, 2.0, 1.5]
     bounds = [(5, 30), (20, 60), (10, 200), (5, 30), (0.5, 5), (0.5, 5)]
-    
-    result = minimize(
-        objective_function,
-        initial_params,
-        args=(data,),
-        method='L-BFGS-B',
-        bounds=bounds
-    )
+    index = DonchianIndex(data['High'], data['Low'], max_window=max(bounds[0][1], bounds[1][1]))
+    
+    if method == 'L-BFGS-B':
+        result = minimize(
+            objective_function,
+            initial_params,
+            args=(data, index),
+            method='L-BFGS-B',
+            bounds=bounds
+        )
+    else:
+        # Periods are integers, so search a lattice ('grid' or 'tpe') and backtest each setting once
+        result = minimize_lattice(objective_function, initial_params, bounds, integer=[True] * 4 + [False] * 2,
+                                  args=(data, index), method=method, seed=0)
     
     return result.x
 
+def evaluate_parameters(data, params, start=1):
+    # Total return of one parameter set, scored from row `start` on
+    ichimoku = ichimoku_cloud(data, int(params[0]), int(params[1]))
+    signals = calculate_signals(data, ichimoku, int(params[2]), int(params[3]), params[4], params[5])
+    return calculate_returns(data, signals, start).sum()
+
+def run_walk_forward(data, folds, anchored=False):
+    # Warm-up covers the longest EMA period in the search bounds
+    report = walk_forward(data, optimize_parameters, evaluate_parameters, folds=folds,
+                          anchored=anchored, warmup=200, columns=['Open', 'High', 'Low', 'Close'])
+    for fold, row in report.iterrows():
+        params = ', '.join(f"{p:.2f}" for p in row['params'])
+        print(f"Fold {fold}: test from {row['test_from']} | in-sample {row['in_sample']:.2%} | "
+              f"out-of-sample {row['out_of_sample']:.2%} | params [{params}]")
+    summary = summarize(report)
+    print(f"Out-of-sample total return: {summary['out_of_sample_total']:.2%}")
+    print(f"Mean in-sample vs out-of-sample fold return: {summary['in_sample_mean']:.2%} vs {summary['out_of_sample_mean']:.2%}")
+    print(f"Profitable folds: {summary['positive_folds']:.0%}")
+    return report
+
 if __name__ == "__main__":
-    # Load data from local CSV file
-    data = pd.read_csv("./gold_1h.csv")
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--walk-forward', type=int, default=0, metavar='FOLDS',
+                        help='optimize and test out of sample over this many folds instead')
+    parser.add_argument('--anchored', action='store_true', help='grow training windows from the first bar')
+    args = parser.parse_args()
+
+    # Load data from local CSV file through the bar store
+    data = read_bars("./gold_1h.csv")
+    
+    if args.walk_forward:
+        run_walk_forward(data, args.walk_forward, args.anchored)
+        sys.exit()
     
     # Optimize parameters
     optimized_params = optimize_parameters(data)
+    print(f"Indicator cache: {default_cache.stats()}")
     
     print("Optimized Parameters:")
     print(f"Conversion Period: {int(optimized_params[0])}")
@@ -132,9 +146,10 @@ if __name__ == "__main__":
     print(f"Number of trades: {len(strategy_returns[strategy_returns != 0])}")
     print(f"Total return: {strategy_returns.sum():.2%}")
     
-    # Run simple Monte Carlo simulation using pandas-montecarlo
+    # Run simple Monte Carlo simulation over the trade returns
     if not strategy_returns.empty:
-        mc = strategy_returns.montecarlo(sims=1000, bust=-0.1, goal=1.0)
+        with profiler.stage('slope.montecarlo', rows=len(strategy_returns)):
+            mc = montecarlo(strategy_returns, sims=1000, bust=-0.1, goal=1.0)
         
         # Print Monte Carlo statistics
         print("\nMonte Carlo Simulation Results:")
@@ -143,6 +158,9 @@ if __name__ == "__main__":
         print(f"Standard Deviation: {mc.stats['std']:.2%}")
         print(f"Minimum Return: {mc.stats['min']:.2%}")
         print(f"Maximum Return: {mc.stats['max']:.2%}")
+        print(f"Worst Drawdown: {mc.stats['maxdd']:.2%}")
+        print(f"Bust Probability: {mc.stats['bust']:.2%}")
+        print(f"Goal Probability: {mc.stats['goal']:.2%}")
         
         # Plot the Monte Carlo simulations
         plt.figure(figsize=(10, 6))
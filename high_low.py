@@ -1,43 +1,80 @@
-import pandas as pd
+import argparse
 
-# Load the WTI data
-data = pd.read_csv('WTI_prices.csv', parse_dates=['Datetime'], index_col='Datetime')
+from common.bar_store import ingest_bars
+from common.range_index import DonchianIndex
+from common.sweep import SweepExecutor
 
 # Define the backtesting function
-def backtest_strategy(data, n):
+def backtest_strategy(data, n, index=None, verbose=True):
+    # Lowest low and highest high over the last n periods (excluding the current bar)
+    if index is None:
+        index = DonchianIndex(data['High'], data['Low'], max_window=n)
+    lowest_lows = index.lowest(n, closed='left')
+    highest_highs = index.highest(n, closed='left')
+    return run_breakout(data, n, lowest_lows, highest_highs, verbose)
+
+def run_breakout(data, n, lowest_lows, highest_highs, verbose=True):
     cash = 10000  # Starting cash
     position = 0  # Current position (0 means no position, 1 means holding)
     entry_price = 0  # Price at which the position was entered
+    close = data['Close'].to_numpy()
 
     for i in range(n, len(data)):
-        # Calculate the lowest low and highest high over the last n periods
-        lowest_low = data['Low'].iloc[i-n:i].min()
-        highest_high = data['High'].iloc[i-n:i].max()
-
         # Buy signal: close is lower than the lowest low of the last n candles
-        if data['Close'].iloc[i] < lowest_low and position == 0:
+        if close[i] < lowest_lows[i] and position == 0:
             position = 1
-            entry_price = data['Close'].iloc[i]
-            print(f"Buying at {entry_price} on {data.index[i]}")
+            entry_price = close[i]
+            if verbose:
+                print(f"Buying at {entry_price} on {data.index[i]}")
 
         # Sell signal: close is higher than the highest high of the last n candles
-        elif data['Close'].iloc[i] > highest_high and position == 1:
+        elif close[i] > highest_highs[i] and position == 1:
             position = 0
-            exit_price = data['Close'].iloc[i]
+            exit_price = close[i]
             cash += (exit_price - entry_price) * 1  # Assume 1 unit is traded
-            print(f"Selling at {exit_price} on {data.index[i]}, Cash: {cash}")
+            if verbose:
+                print(f"Selling at {exit_price} on {data.index[i]}, Cash: {cash}")
 
     return cash
 
-# Test different n values
-best_n = None
-best_value = float('-inf')
+# Range index per loaded data set, so each worker builds it once for the whole sweep
+_range_indexes = {}
+
+def get_range_index(data):
+    key = id(data)
+    if key not in _range_indexes:
+        _range_indexes.clear()
+        _range_indexes[key] = (data, DonchianIndex(data['High'], data['Low'], max_window=99))
+    return _range_indexes[key][1]
+
+def evaluate_n(data, n):
+    return backtest_strategy(data, n, get_range_index(data), verbose=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-cache', action='store_true', help='rerun backtests scored by earlier runs')
+    args = parser.parse_args()
+
+    # Load the WTI data
+    store, symbol = ingest_bars('WTI_prices.csv')
+    data = store.load(symbol)
+
+    # Test different n values in parallel; results from an earlier run on the same bars
+    # and code come from the bar store's result cache instead
+    n_values = list(range(2, 100))
+    cache = None if args.no_cache else store.result_cache()
+    with SweepExecutor(data, cache=cache, dataset=symbol) as executor:
+        results = executor.map(evaluate_n, n_values)
+
+    best_n = None
+    best_value = float('-inf')
 
-for n in range(2, 100):
-    final_cash = backtest_strategy(data, n)
-    print(f"n: {n}, Final Cash: {final_cash}")
-    if final_cash > best_value:
-        best_value = final_cash
-        best_n = n
+    for n, final_cash in zip(n_values, results):
+        print(f"n: {n}, Final Cash: {final_cash}")
+        if final_cash > best_value:
+            best_value = final_cash
+            best_n = n
 
-print(f'Best n: {best_n}, Final Portfolio Value: {best_value}')
\ No newline at end of file
+    print(f'Best n: {best_n}, Final Portfolio Value: {best_value}')
+    if cache is not None:
+        print(f'Result cache: {cache.stats()}')
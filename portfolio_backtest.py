@@ -0,0 +1,21 @@
+import sys
+
+from common.bar_store import BarStore
+from common.portfolio import BarPanel, ichimoku_portfolio, triple_ema_portfolio
+
+# Run the Ichimoku and triple EMA strategies over every symbol in the bar store
+# (or the symbols given on the command line) as one portfolio
+if __name__ == "__main__":
+    store = BarStore()
+    symbols = sys.argv[1:] or store.symbols()
+    if not symbols:
+        print("No symbols in the bar store. Run yahoo.py or data_downloader.py first.")
+        sys.exit(1)
+
+    panel = BarPanel.from_store(store, symbols)
+    print(f"{len(panel.symbols)} symbols x {len(panel.index)} bars")
+
+    for name, strategy in (('Ichimoku Cloud', ichimoku_portfolio), ('Triple EMA', triple_ema_portfolio)):
+        result = strategy(panel)
+        print(f"\n{name}: portfolio return {result.equity.iloc[-1] - 1:.2%}")
+        print(result.attribution.to_string(float_format=lambda x: f"{x:.4f}"))
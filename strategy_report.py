@@ -0,0 +1,124 @@
+import argparse
+import importlib.util
+import os
+
+import pandas as pd
+
+from common import indicators
+from common.bar_store import read_bars
+from common.bars import Bars
+from common.indicator_cache import default_cache
+from common.metrics import trade_metrics
+from common.runner import StrategyRunner, indicator
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Parameters each strategy is reported with
+HIGH_LOW_N = 20
+TRIPLE_EMA = {'short_period': 10, 'medium_period': 30, 'long_period': 100, 'tp_percent': 0.05, 'sl_percent': 0.05}
+FISHER = {'fisher_period': 10, 'ema_period': 17, 'tp': 1.1, 'sl': 0.9}
+FRACTAL = {'window_size': 2, 'stop_loss_multiplier': 0.02, 'take_profit_multiplier': 0.03}
+
+
+def load_script(name, path):
+    # Strategy scripts live in plain folders (and 3ema.py is not a valid module name)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+high_low = load_script('high_low', 'high_low.py')
+triple_ema = load_script('triple_ema', 'ema/3ema.py')
+cloud = load_script('cloud_test', 'cloud/cloud_test.py')
+fisher_test = load_script('fisher_test', 'william/fisher_test.py')
+fractal = load_script('fractal', 'william/fractal.py')
+
+
+def trade_stats(trades):
+    metrics = trade_metrics(trades)
+    return {key: metrics[key] for key in ('trades', 'win_rate', 'profit_factor', 'max_drawdown')}
+
+
+def report_high_low(bars, values):
+    cash = high_low.run_breakout(bars, HIGH_LOW_N, values['lowest'], values['highest'], verbose=False)
+    return {'result': cash - 10000, 'measure': 'PnL (1 unit)'}
+
+
+def report_triple_ema(bars, values):
+    # The EMAs come from the shared indicator cache
+    total_pnl, win_rate = triple_ema.backtest(bars, **TRIPLE_EMA)
+    return {'result': total_pnl, 'measure': 'PnL (price)', 'win_rate': win_rate}
+
+
+def report_cloud(bars, values):
+    strategy = cloud.IchimokuCloudStrategy()
+    strategy.data = bars.reset_index()
+    strategy.data['EMA'] = values['ema']
+    strategy.data['ATR'] = values['atr']
+    strategy.calculate_signals(pd.Series(values['conversion'], index=strategy.data.index),
+                               pd.Series(values['base'], index=strategy.data.index))
+    returns = strategy.calculate_returns()
+    return {'result': returns.sum(), 'measure': 'sum of trade returns', **trade_stats(strategy.trades)}
+
+
+def report_fisher(bars, values):
+    # Fisher transform and EMA come from the shared indicator cache
+    final = fisher_test.strategy(bars, **FISHER)
+    return {'result': final, 'measure': 'final equity multiple'}
+
+
+def report_fractal(bars, values):
+    trades = fractal.run_fractal_backtest(bars.reset_index(), FRACTAL).trades
+    pnl = (trades['exit_price'] - trades['entry_price']).sum()
+    return {'result': pnl / 10000 * 100, 'measure': 'PnL % of 10000', **trade_stats(trades)}
+
+
+def build_runner(bars):
+    strategy = cloud.IchimokuCloudStrategy()
+    runner = StrategyRunner(bars)
+    runner.add('high_low', report_high_low,
+               lowest=indicator(indicators.lowest, 'Low', period=HIGH_LOW_N, closed='left'),
+               highest=indicator(indicators.highest, 'High', period=HIGH_LOW_N, closed='left'))
+    runner.add('triple_ema', report_triple_ema,
+               **{f'ema_{p}': indicator(indicators.ema, 'Close', period=TRIPLE_EMA[p])
+                  for p in ('short_period', 'medium_period', 'long_period')})
+    runner.add('ichimoku_cloud', report_cloud,
+               ema=indicator(indicators.ema, 'Close', period=strategy.ema_period),
+               atr=indicator(indicators.atr, 'High', 'Low', 'Close', period=strategy.atr_period),
+               conversion=indicator(indicators.donchian_midline, 'High', 'Low', period=strategy.conversion_period),
+               base=indicator(indicators.donchian_midline, 'High', 'Low', period=strategy.base_period))
+    runner.add('fisher', report_fisher,
+               fisher=indicator(indicators.fisher_transform, 'High', 'Low', 'Close', period=FISHER['fisher_period']),
+               ema=indicator(indicators.ema, 'Close', period=FISHER['ema_period']))
+    runner.add('fractal', report_fractal)
+    return runner
+
+
+def report_periods(bars, freq):
+    # One report per calendar period; each period's bars are a view of the loaded ones,
+    # and its indicators warm up from the period's first bar
+    reports = {}
+    for start, period in Bars.from_frame(bars).periods(freq):
+        reports[start] = build_runner(period.frame()).run()
+    return pd.concat(reports, names=['period'])
+
+
+# Daily report: every strategy on one instrument, bars loaded and indicators computed once
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run all strategies on one bar file.")
+    parser.add_argument('csv', nargs='?', default='WTI_prices.csv')
+    parser.add_argument('--by', choices=['year', 'month'], help='report each calendar year or month separately')
+    args = parser.parse_args()
+
+    bars = read_bars(args.csv)[['Open', 'High', 'Low', 'Close']]
+    if args.by:
+        report = report_periods(bars, {'year': 'YS', 'month': 'MS'}[args.by])
+        print(f"{args.csv}: {len(bars)} bars, {report.index.get_level_values('period').nunique()} {args.by}s")
+    else:
+        runner = build_runner(bars)
+        report = runner.run()
+        print(f"{args.csv}: {len(bars)} bars, {len(runner.required())} distinct indicators "
+              f"in {runner.timings['indicators']:.3f}s")
+    print(report.to_string(float_format=lambda x: f"{x:.4f}"))
+    print(f"Indicator cache: {default_cache.stats()}")
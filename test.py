@@ -1,3 +1,3 @@
-import pandas as pd
-df = pd.read_csv("./WTI_prices.csv")
+from common.bar_store import read_bars
+df = read_bars("./WTI_prices.csv")
 print(df)
\ No newline at end of file
@@ -1,13 +1,21 @@
 import pandas as pd
 import numpy as np
-import yfinance as yf
 from scipy.optimize import minimize
+import os
+import sys
 
-# Data loading function using yfinance
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import indicators
+from common.downloader import Downloader
+from common.indicator_cache import default_cache
+from common.search import minimize_lattice
+
+# Data loading function using the cached downloader
 def load_data():
     try:
-        # Download Gold Futures 1-hour data
-        data = yf.download('GC=F', interval='1h', period='1y')
+        # Download Gold Futures 1-hour data, only fetching bars not cached yet
+        start = pd.Timestamp.now(tz='UTC') - pd.DateOffset(years=1)
+        data = Downloader().load('GC=F', interval='1h', start=start)
         if data.empty:
             raise ValueError("No data found for Gold Futures.")
         data = data[['Open', 'High', 'Low', 'Close']]
@@ -16,33 +24,32 @@ def load_data():
         print(f"Error downloading data: {e}")
         return pd.DataFrame()
 
-# Fisher Transform calculation
+# Fisher Transform calculation, cached across optimizer evaluations
 def calculate_fisher_transform(data, period):
-    high = data['High'].rolling(window=period).max()
-    low = data['Low'].rolling(window=period).min()
-    value = 0.33 * 2 * ((data['Close'] - low) / (high - low) - 0.5)
-    fisher = np.log((1 + value) / (1 - value))
-    return fisher.cumsum()
+    fisher = default_cache.compute(indicators.fisher_transform, data['High'], data['Low'], data['Close'], period=period)
+    return pd.Series(fisher, index=data.index)
 
 # Strategy function
 def strategy(data, fisher_period, ema_period, tp, sl):
     if data.empty:
         return 0  # Return zero if data is empty
 
-    data['Fisher'] = calculate_fisher_transform(data, fisher_period)
-    data['EMA'] = data['Close'].ewm(span=ema_period, adjust=False).mean()
-    data['Signal'] = np.where((data['Fisher'] > 0) & (data['Close'] > data['EMA']), 1, 
-                              np.where((data['Fisher'] < 0) & (data['Close'] < data['EMA']), -1, 0))
-    data['Returns'] = data['Signal'].shift(1) * data['Close'].pct_change()
-    data['Cumulative'] = (1 + data['Returns']).cumprod()
+    # Everything stays local, so data is only read and trials can share it
+    close = data['Close']
+    fisher = calculate_fisher_transform(data, fisher_period)
+    ema = default_cache.compute(indicators.ema, close, period=ema_period)
+    signal = pd.Series(np.where((fisher > 0) & (close > ema), 1,
+                                np.where((fisher < 0) & (close < ema), -1, 0)), index=data.index)
+    returns = signal.shift(1) * close.pct_change()
+    cumulative = (1 + returns).cumprod()
 
     # Apply TP/SL logic
-    data['TP'] = np.where(data['Cumulative'] >= tp, tp, np.nan)
-    data['SL'] = np.where(data['Cumulative'] <= sl, sl, np.nan)
-    
-    # Calculate final returns
-    data['Final'] = data[['TP', 'SL']].min(axis=1)
-    return data['Final'].iloc[-1] if not data['Final'].isnull().all() else data['Cumulative'].iloc[-1]
+    take_profit = np.where(cumulative >= tp, tp, np.nan)
+    stop_loss = np.where(cumulative <= sl, sl, np.nan)
+
+    # Calculate final returns (the smaller of TP/SL where either applies)
+    final = np.fmin(take_profit, stop_loss)
+    return final[-1] if not np.isnan(final).all() else cumulative.iloc[-1]
 
 # Objective function for optimization
 def objective(params, data, fisher_period, ema_period):
@@ -50,10 +57,15 @@ def objective(params, data, fisher_period, ema_period):
     return -strategy(data, fisher_period, ema_period, tp, sl)  # Negative for maximization
 
 # Optimization function
-def optimize_parameters(data, fisher_period, ema_period):
+def optimize_parameters(data, fisher_period, ema_period, method='grid'):
     initial_guess = [1.1, 0.9]  # Initial TP and SL
     bounds = [(1.01, 2.0), (0.5, 0.99)]  # Bounds for TP and SL
-    result = minimize(objective, initial_guess, args=(data, fisher_period, ema_period), bounds=bounds, method='L-BFGS-B')
+    if method == 'L-BFGS-B':
+        result = minimize(objective, initial_guess, args=(data, fisher_period, ema_period), bounds=bounds, method='L-BFGS-B')
+    else:
+        # The objective is flat between TP/SL crossings, so search a lattice and evaluate each point once
+        result = minimize_lattice(objective, initial_guess, bounds, args=(data, fisher_period, ema_period),
+                                  method=method, seed=0)
     return result.x
 
 # Main function
@@ -67,6 +79,7 @@ def main():
     ema_period = 17
     best_params = optimize_parameters(data, fisher_period, ema_period)
     print(f"Optimized TP: {best_params[0]}, SL: {best_params[1]}")
+    print(f"Indicator cache: {default_cache.stats()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,161 +1,119 @@
 import pandas as pd
+import numpy as np
 import optuna
 import matplotlib.pyplot as plt
-
-# Load the data from the CSV file
-df = pd.read_csv('WTI_prices.csv')
-
-# Ensure the 'Datetime' column is of datetime type
-df['Datetime'] = pd.to_datetime(df['Datetime'], utc=True)
-
-# Function to calculate fractals
+import argparse
+import functools
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.bar_store import ingest_bars
+from common.fractals import four_point_fractal_masks
+from common.intrabar import IntrabarResolver, bar_times
+from common.profiling import profiler
+from common.pruning import PRUNERS, chunked_backtest, make_pruner
+from common.sweep import SweepExecutor
+
+# Function to calculate fractals (high/low of the fractal bar, 0 elsewhere), leaving df untouched
 def calculate_fractals(df, window_size):
-    df['Bearish_Fractal'] = 0
-    df['Bullish_Fractal'] = 0
-
-    for i in range(window_size, len(df) - window_size):
-        if (df['High'].iloc[i] > df['High'].iloc[i-window_size] and 
-            df['High'].iloc[i] > df['High'].iloc[i-window_size+1] and 
-            df['High'].iloc[i] > df['High'].iloc[i+1] and 
-            df['High'].iloc[i] > df['High'].iloc[i+window_size]):
-            df['Bearish_Fractal'].iloc[i] = df['High'].iloc[i]
-
-        if (df['Low'].iloc[i] < df['Low'].iloc[i-window_size] and 
-            df['Low'].iloc[i] < df['Low'].iloc[i-window_size+1] and 
-            df['Low'].iloc[i] < df['Low'].iloc[i+1] and 
-            df['Low'].iloc[i] < df['Low'].iloc[i+window_size]):
-            df['Bullish_Fractal'].iloc[i] = df['Low'].iloc[i]
-
-    return df
-
-# Define the backtest function
-def backtest_strategy(df, params, initial_balance):
+    bullish, bearish = four_point_fractal_masks(df['High'], df['Low'], window_size)
+    return pd.DataFrame({
+        'Bearish_Fractal': np.where(bearish, df['High'], 0.0),
+        'Bullish_Fractal': np.where(bullish, df['Low'], 0.0),
+    }, index=df.index)
+
+# Long-only fractal backtest: buy on bullish fractals, exit on bearish fractals or SL/TP
+def run_fractal_backtest(df, params, trial=None, score=None, chunks=4, intrabar=None):
     window_size = params['window_size']
     stop_loss_multiplier = params['stop_loss_multiplier']
     take_profit_multiplier = params['take_profit_multiplier']
 
-    df = calculate_fractals(df, window_size)
-
-    df['Signal'] = 0
-    df['Entry_Price'] = 0
-    df['Exit_Price'] = 0
-    df['Trade_PnL'] = 0
-
-    for i in range(len(df)):
-        if df['Bullish_Fractal'].iloc[i] > 0:
-            # Buy signal
-            df['Signal'].iloc[i] = 1
-            df['Entry_Price'].iloc[i] = df['Close'].iloc[i]
-        elif df['Bearish_Fractal'].iloc[i] > 0:
-            # Sell signal
-            df['Signal'].iloc[i] = -1
-            df['Exit_Price'].iloc[i] = df['Close'].iloc[i]
-
-    position = 0
-    previous_price = 0
-    cumulative_pnl = 0
+    close = df['Close'].to_numpy(dtype=float)
+    high = df['High'].to_numpy(dtype=float)
+    low = df['Low'].to_numpy(dtype=float)
+
+    def signals(start, stop):
+        # Fractals only look window_size bars either way, so pad the slice by that much
+        lo, hi = max(start - window_size, 0), min(stop + window_size, len(close))
+        bullish, bearish = four_point_fractal_masks(high[lo:hi], low[lo:hi], window_size)
+        bullish, bearish = bullish[start - lo:stop - lo], bearish[start - lo:stop - lo]
+        signal = np.where(bullish, 1, np.where(bearish, -1, 0))
+        stop_loss = close[start:stop] - (close[start:stop] * stop_loss_multiplier)
+        take_profit = close[start:stop] + (close[start:stop] * take_profit_multiplier)
+        return signal, stop_loss, take_profit
+
+    # A repeated buy signal resets the entry price, and SL/TP apply from the entry bar.
+    # With a trial, score(trades) is reported after each chunk so weak trials can be pruned.
+    # An intrabar resolver re-decides bars that touched both SL and TP from lower-timeframe bars
+    return chunked_backtest(trial, score, close, high, low, signals,
+                            chunks=chunks, record_returns=False, stops='entry', on_opposite='close',
+                            allow_short=False, check_entry_bar=True, refresh_on_repeat=True, signal_first=True,
+                            index=bar_times(df) if intrabar is not None else None, intrabar=intrabar)
 
-    for i in range(len(df)):
-        if df['Signal'].iloc[i] == 1:
-            # Enter long position
-            position = 1
-            previous_price = df['Entry_Price'].iloc[i]
-        elif df['Signal'].iloc[i] == -1:
-            # Exit long position
-            if position == 1:
-                df['Trade_PnL'].iloc[i] = df['Exit_Price'].iloc[i] - previous_price
-                cumulative_pnl += df['Trade_PnL'].iloc[i]
-                position = 0
-
-        # Apply stop loss and take profit
-        if position == 1:
-            stop_loss = previous_price - (previous_price * stop_loss_multiplier)
-            take_profit = previous_price + (previous_price * take_profit_multiplier)
-            if df['Low'].iloc[i] <= stop_loss:
-                df['Trade_PnL'].iloc[i] = stop_loss - previous_price
-                cumulative_pnl += df['Trade_PnL'].iloc[i]
-                position = 0
-            elif df['High'].iloc[i] >= take_profit:
-                df['Trade_PnL'].iloc[i] = take_profit - previous_price
-                cumulative_pnl += df['Trade_PnL'].iloc[i]
-                position = 0
+# Define the backtest function
+def backtest_strategy(df, params, initial_balance, trial=None, intrabar=None):
+    def pnl_percent(trades):
+        cumulative_pnl = (trades['exit_price'] - trades['entry_price']).sum()
+        return cumulative_pnl / initial_balance * 100
 
-    return cumulative_pnl / initial_balance * 100
+    return pnl_percent(run_fractal_backtest(df, params, trial, pnl_percent, intrabar=intrabar).trades)
 
 # Define the optimization function
-def optimize_strategy(trial):
+@profiler.instrument('fractal.trial', rows=lambda trial, df, **kwargs: len(df),
+                     tags=lambda trial, df, **kwargs: {'trial': trial.number})
+def optimize_strategy(trial, df, intrabar=None):
     params = {
         'window_size': trial.suggest_int('window_size', 2, 10),
         'stop_loss_multiplier': trial.suggest_float('stop_loss_multiplier', 0.01, 0.05),
         'take_profit_multiplier': trial.suggest_float('take_profit_multiplier', 0.01, 0.05)
     }
-    return backtest_strategy(df, params, initial_balance=10000)
-
-# Perform optimization
-study = optuna.create_study(direction='maximize')
-study.optimize(optimize_strategy, n_trials=100)
-
-# Print the best parameters and the corresponding PnL
-best_params = study.best_params
-best_pnl = study.best_value
-print(f"Best Parameters: {best_params}")
-print(f"Best PnL (%): {best_pnl:.2f}%")
-
-# Plot the results with the best parameters
-best_df = calculate_fractals(df, best_params['window_size'])
-best_df['Signal'] = 0
-best_df['Entry_Price'] = 0
-best_df['Exit_Price'] = 0
-best_df['Trade_PnL'] = 0
-
-for i in range(len(best_df)):
-    if best_df['Bullish_Fractal'].iloc[i] > 0:
-        # Buy signal
-        best_df['Signal'].iloc[i] = 1
-        best_df['Entry_Price'].iloc[i] = best_df['Close'].iloc[i]
-    elif best_df['Bearish_Fractal'].iloc[i] > 0:
-        # Sell signal
-        best_df['Signal'].iloc[i] = -1
-        best_df['Exit_Price'].iloc[i] = best_df['Close'].iloc[i]
-
-position = 0
-previous_price = 0
-cumulative_pnl = 0
-
-for i in range(len(best_df)):
-    if best_df['Signal'].iloc[i] == 1:
-        # Enter long position
-        position = 1
-        previous_price = best_df['Entry_Price'].iloc[i]
-    elif best_df['Signal'].iloc[i] == -1:
-        # Exit long position
-        if position == 1:
-            best_df['Trade_PnL'].iloc[i] = best_df['Exit_Price'].iloc[i] - previous_price
-            cumulative_pnl += best_df['Trade_PnL'].iloc[i]
-            position = 0
-
-    # Apply stop loss and take profit
-    if position == 1:
-        stop_loss = previous_price - (previous_price * best_params['stop_loss_multiplier'])
-        take_profit = previous_price + (previous_price * best_params['take_profit_multiplier'])
-        if best_df['Low'].iloc[i] <= stop_loss:
-            best_df['Trade_PnL'].iloc[i] = stop_loss - previous_price
-            cumulative_pnl += best_df['Trade_PnL'].iloc[i]
-            position = 0
-        elif best_df['High'].iloc[i] >= take_profit:
-            best_df['Trade_PnL'].iloc[i] = take_profit - previous_price
-            cumulative_pnl += best_df['Trade_PnL'].iloc[i]
-            position = 0
-
-best_df['Cumulative_PnL'] = best_df['Trade_PnL'].cumsum() / 10000 * 100
-
-plt.figure(figsize=(12, 6))
-plt.plot(best_df['Datetime'], best_df['Close'], label='Close Price')
-plt.plot(best_df['Datetime'], best_df['Cumulative_PnL'], label='Cumulative PnL (%)')
-plt.scatter(best_df['Datetime'], best_df['Entry_Price'], color='green', label='Buy Signal')
-plt.scatter(best_df['Datetime'], best_df['Exit_Price'], color='red', label='Sell Signal')
-plt.xlabel('Datetime')
-plt.ylabel('Price')
-plt.title('Fractal Trading Strategy Backtest with Optimized Parameters')
-plt.legend()
-plt.show()
\ No newline at end of file
+    return backtest_strategy(df, params, initial_balance=10000, trial=trial, intrabar=intrabar)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pruner', choices=PRUNERS, default='median', help='how to stop unpromising trials early')
+    parser.add_argument('--intrabar', metavar='CSV',
+                        help='lower-timeframe bars for resolving bars that touch both SL and TP')
+    parser.add_argument('--no-cache', action='store_true', help='rerun parameter sets scored by earlier studies')
+    args = parser.parse_args()
+
+    # Load the data through the bar store; the UTC index goes to the workers with the bars
+    store, symbol = ingest_bars('WTI_prices.csv')
+    df = store.load(symbol)
+    intrabar = IntrabarResolver.from_csv(args.intrabar) if args.intrabar else None
+
+    # Perform optimization, each worker running trials on its own view of the shared bars;
+    # parameter sets earlier studies scored on the same bars and code come from the result cache
+    cache = None if args.no_cache else store.result_cache()
+    study = optuna.create_study(direction='maximize', pruner=make_pruner(args.pruner))
+    with SweepExecutor(df, columns=['Open', 'High', 'Low', 'Close'], cache=cache, dataset=symbol) as executor:
+        executor.optimize(study, functools.partial(optimize_strategy, intrabar=intrabar), n_trials=100)
+
+    # Print the best parameters and the corresponding PnL
+    best_params = study.best_params
+    best_pnl = study.best_value
+    print(f"Best Parameters: {best_params}")
+    print(f"Best PnL (%): {best_pnl:.2f}%")
+    if cache is not None:
+        print(f"Result cache: {cache.stats()}")
+
+    # Plot the results with the best parameters
+    fractals = calculate_fractals(df, best_params['window_size'])
+    trades = run_fractal_backtest(df, best_params, intrabar=intrabar).trades
+    close = df['Close'].to_numpy()
+    signal = np.where(fractals['Bullish_Fractal'] > 0, 1, np.where(fractals['Bearish_Fractal'] > 0, -1, 0))
+    trade_pnl = np.zeros(len(df))
+    np.add.at(trade_pnl, trades['exit_index'], trades['exit_price'] - trades['entry_price'])
+    cumulative_pnl = np.cumsum(trade_pnl) / 10000 * 100
+
+    plt.figure(figsize=(12, 6))
+    plt.plot(df.index, df['Close'], label='Close Price')
+    plt.plot(df.index, cumulative_pnl, label='Cumulative PnL (%)')
+    plt.scatter(df.index, np.where(signal == 1, close, 0), color='green', label='Buy Signal')
+    plt.scatter(df.index, np.where(signal == -1, close, 0), color='red', label='Sell Signal')
+    plt.xlabel('Datetime')
+    plt.ylabel('Price')
+    plt.title('Fractal Trading Strategy Backtest with Optimized Parameters')
+    plt.legend()
+    plt.show()
\ No newline at end of file
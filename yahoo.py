@@ -1,13 +1,17 @@
-import yfinance as yf
+from common.bar_store import read_bars
+from common.downloader import Downloader
 
 # Define the ticker symbol for Crude Oil Futures
 ticker = 'CL=F'
 
-# Download the historical data
-data = yf.download(ticker, interval='1h', start='2023-01-01', end='2023-12-31')
+# Download the historical data, fetching only bars missing from the local cache
+data = Downloader().load(ticker, interval='1h', start='2023-01-01', end='2023-12-31')
 
 # Display the data
 print(data)
 
 # Save the data to a CSV file
-data.to_csv('WTI_prices.csv')
\ No newline at end of file
+data.to_csv('WTI_prices.csv')
+
+# Ingest into the bar store so the strategy scripts can memory-map it
+read_bars('WTI_prices.csv')